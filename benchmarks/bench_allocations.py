@@ -0,0 +1,99 @@
+"""Peak traced memory of a full neuron lookup in the cell type connectivity app.
+
+Runs the data steps of update_data (partner tables with properties) followed by
+make_plots on a fresh data object, with the synapse data already cached, and reports
+the peak of tracemalloc memory above the starting point for each step and for the
+whole lookup.
+
+Run with `python -m benchmarks.bench_allocations`.
+"""
+
+import json
+import tracemalloc
+
+from dash_connectivity_viewer.cell_type_connectivity.callbacks import make_plots
+from dash_connectivity_viewer.cell_type_connectivity.config import (
+    TypedConnectivityConfig,
+)
+from dash_connectivity_viewer.cell_type_connectivity.neuron_data_cortex import (
+    NeuronDataCortex,
+)
+
+from .bench_suite import SIZES
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+
+
+def _neuron_data(client, root_id, config):
+    return NeuronDataCortex(
+        root_id,
+        client,
+        config,
+        cell_type_table=CELL_TYPE_TABLE,
+        schema_name="cell_type_local",
+    )
+
+
+def _steps(nrn, config):
+    return {
+        "partners_out_plus": nrn.partners_out_plus,
+        "partners_in_plus": nrn.partners_in_plus,
+        "make_plots": lambda: make_plots(nrn, config),
+    }
+
+
+def _lookup(client, root_id, config):
+    nrn = _neuron_data(client, root_id, config)
+    for step in _steps(nrn, config).values():
+        step()
+
+
+def peak_memory(func):
+    """Peak traced memory in bytes while running func, above the memory before it"""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start
+
+
+def run(sizes=("small", "medium", "large"), seed=0):
+    config = TypedConnectivityConfig(fake_config())
+    results = []
+    for size in sizes:
+        n_syn, n_partners = SIZES[size]
+        tables = make_tables(n_syn=n_syn, n_partners=n_partners, seed=seed)
+        root_id = int(tables[SYNAPSE_TABLE]["pre_pt_root_id"].iloc[0])
+        client = FakeCAVEclient(tables)
+        with fake_backend(client):
+            # Fills the synapse and property caches, so only the lookup is measured
+            _lookup(client, root_id, config)
+            peaks = {"lookup": peak_memory(lambda: _lookup(client, root_id, config))}
+            nrn = _neuron_data(client, root_id, config)
+            # Loads the synapse data from the cache before the steps are measured
+            nrn.synapse_data_resolution
+            for name, step in _steps(nrn, config).items():
+                peaks[name] = peak_memory(step)
+        results.append(
+            {
+                "size": size,
+                "n_syn": n_syn,
+                "n_partners": n_partners,
+                "peak_bytes": peaks,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,79 @@
+"""Bytes decoded per materialization request with and without column projection.
+
+Run with `python -m benchmarks.bench_column_projection`.
+"""
+
+import json
+
+from dash_connectivity_viewer.common.config import CommonConfig
+from dash_connectivity_viewer.common.dataframe_utilities import (
+    get_specific_soma,
+    post_synapse_df,
+    pre_synapse_df,
+    property_table_data,
+)
+from dash_connectivity_viewer.common.lookup_utilities import (
+    get_nucleus_id_from_root_id,
+    get_root_id_from_nuc_id,
+)
+from dash_connectivity_viewer.common.neuron_data_base import _soma_property_entry
+
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    SOMA_TABLE,
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_config,
+    make_tables,
+)
+
+
+def _requests(client, config, root_id):
+    pre_df = pre_synapse_df(SYNAPSE_TABLE, root_id, client, None, config)
+    post_synapse_df(SYNAPSE_TABLE, root_id, client, None, config)
+    partners = pre_df[config.post_pt_root_id].unique()
+
+    property_tables = _soma_property_entry(SOMA_TABLE, config)
+    property_tables[CELL_TYPE_TABLE] = {
+        "root_id": "pt_root_id",
+        "include": ["classification_system", "cell_type"],
+    }
+    property_table_data(partners, property_tables, client, None)
+    get_specific_soma(
+        SOMA_TABLE,
+        root_id,
+        client,
+        None,
+        select_columns=config.soma_table_select_columns,
+    )
+    nuc_id = get_nucleus_id_from_root_id(root_id, client, SOMA_TABLE, config)
+    get_root_id_from_nuc_id(nuc_id, client, SOMA_TABLE, config)
+
+
+def run(n_syn=10_000, n_partners=1_000):
+    tables = make_tables(n_syn=n_syn, n_partners=n_partners)
+    root_id = int(tables[SYNAPSE_TABLE]["pre_pt_root_id"].iloc[0])
+    config = CommonConfig(fake_config())
+
+    results = {}
+    for label, ignore in [("all_columns", True), ("select_columns", False)]:
+        client = FakeCAVEclient(tables, ignore_select_columns=ignore)
+        _requests(client, config, root_id)
+        results[label] = client.materialize.requests
+    return {
+        "n_syn": n_syn,
+        "n_partners": n_partners,
+        "requests": [
+            {
+                "table": full["table"],
+                "rows": full["rows"],
+                "bytes_all_columns": full["bytes"],
+                "bytes_select_columns": proj["bytes"],
+            }
+            for full, proj in zip(results["all_columns"], results["select_columns"])
+        ],
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps([run(n, p) for n, p in [(1_000, 100), (10_000, 1_000)]], indent=2))
@@ -0,0 +1,133 @@
+"""Incremental live refreshes, against a full live query at the same timestamp.
+
+Refreshes the live synapse data of a neuron, merges some of its input and output
+partners with FakeChunkedgraph.merge, and refreshes again. Checks that the
+incremental refresh, which re-roots only the edited partners, gives the same
+synapse dataframes as a full live query after the edits, that cached refreshes are
+replaced rather than changed, and that a refresh at an earlier timestamp runs a full
+query. Then times both refreshes.
+
+Run with `python -m benchmarks.bench_live_refresh`.
+"""
+
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.common.cache_utilities import LRUCache
+from dash_connectivity_viewer.common.config import CommonConfig
+from dash_connectivity_viewer.common.live_query_utilities import live_synapse_data
+
+from .fake_cave import (
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+from .timing import median_time
+
+# Timestamps of the first refresh, the partner merges, and the second refresh
+T_FIRST = datetime.datetime(2022, 1, 1, 12, 0, 0)
+T_EDIT = T_FIRST + datetime.timedelta(seconds=10)
+T_SECOND = T_FIRST + datetime.timedelta(seconds=20)
+
+
+def _refresh(client, root_id, config, timestamp, cache):
+    return live_synapse_data(
+        SYNAPSE_TABLE, root_id, client, timestamp, config, cache=cache
+    )
+
+
+def _sorted(df, config):
+    return df.sort_values(config.syn_id_col).reset_index(drop=True)
+
+
+def merge_partners(client, root_id, config, n_merges=5):
+    """Merge pairs of output partners and pairs of input partners of root_id.
+
+    Returns
+    -------
+    np.ndarray
+        New root ids of the merged partners.
+    """
+    syn_df = client.materialize.tables[SYNAPSE_TABLE]
+    next_root = int(
+        max(syn_df[config.pre_pt_root_id].max(), syn_df[config.post_pt_root_id].max())
+    )
+    new_roots = []
+    for own_column, partner_column in [
+        (config.pre_pt_root_id, config.post_pt_root_id),
+        (config.post_pt_root_id, config.pre_pt_root_id),
+    ]:
+        partners = syn_df.loc[syn_df[own_column] == root_id, partner_column].unique()
+        partners = partners[partners != root_id]
+        for pair in partners[: 2 * n_merges].reshape(-1, 2):
+            next_root += 1
+            client.chunkedgraph.merge(pair, next_root, timestamp=T_EDIT)
+            new_roots.append(next_root)
+    return np.array(new_roots, dtype=np.int64)
+
+
+def check_refresh(client, root_id, config):
+    """Compare an incremental refresh across partner merges to a full live query"""
+    cache = LRUCache(maxsize=1)
+    _refresh(client, root_id, config, T_FIRST, cache)
+    (key,) = cache.keys()
+    first_entry = cache.get(key)
+    merged_roots = merge_partners(client, root_id, config)
+
+    pre_df, post_df, entry = _refresh(client, root_id, config, T_SECOND, cache)
+    assert entry["new_roots"] is not None, "second refresh was not incremental"
+    assert set(merged_roots) <= set(entry["new_roots"])
+
+    full_pre, full_post, full_entry = _refresh(
+        client, root_id, config, T_SECOND, LRUCache(maxsize=1)
+    )
+    assert full_entry["new_roots"] is None
+
+    # Stored refreshes are replaced, not changed
+    assert first_entry["timestamp"] == T_FIRST
+    assert cache.get(key) is entry
+    # An earlier timestamp gets a full query and keeps the later refresh cached
+    _, _, early_entry = _refresh(client, root_id, config, T_EDIT, cache)
+    assert early_entry["new_roots"] is None
+    assert cache.get(key) is entry
+    pd.testing.assert_frame_equal(_sorted(pre_df, config), _sorted(full_pre, config))
+    pd.testing.assert_frame_equal(_sorted(post_df, config), _sorted(full_post, config))
+    return key, first_entry, len(merged_roots)
+
+
+def run(n_syn=100_000, n_partners=10_000, repeat=5, seed=0):
+    tables = make_tables(n_syn=n_syn, n_partners=n_partners, seed=seed)
+    root_id = int(tables[SYNAPSE_TABLE]["pre_pt_root_id"].iloc[0])
+    client = FakeCAVEclient(tables)
+    config = CommonConfig(fake_config())
+    with fake_backend(client):
+        key, first_entry, n_merges = check_refresh(client, root_id, config)
+
+        def incremental():
+            # Each refresh starts from the first refresh, before the merges
+            last_cache = LRUCache(maxsize=1)
+            last_cache.set(key, first_entry)
+            _refresh(client, root_id, config, T_SECOND, last_cache)
+
+        def full():
+            _refresh(client, root_id, config, T_SECOND, LRUCache(maxsize=1))
+
+        timings = {
+            "full": median_time(full, repeat),
+            "incremental": median_time(incremental, repeat),
+        }
+    return {
+        "n_syn": n_syn,
+        "n_partners": n_partners,
+        "merged_partners": n_merges,
+        **timings,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
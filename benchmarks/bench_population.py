@@ -0,0 +1,93 @@
+"""Population cell type connectivity, with cell type tables read through schema bridges.
+
+Checks that PopulationData finds the same source neurons for a cell type, and the
+same cell type matrix, whether the cell type table is used as is, through a
+dict-style rename schema (pushed down to the table query), or through a schema
+that computes the cell type column (filtered after the reformat). Then times the
+population lookup for each schema.
+
+Run with `python -m benchmarks.bench_population`.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.cell_type_connectivity.config import (
+    TypedConnectivityConfig,
+)
+from dash_connectivity_viewer.cell_type_connectivity.population_data import (
+    PopulationData,
+)
+
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+from .timing import median_time
+
+SCHEMAS = {
+    "none": None,
+    "dict_rename": {
+        "pt_root_id": {"type": "rename", "from": "pt_root_id"},
+        "classification_system": {"type": "rename", "from": "classification_system"},
+        "cell_type": {"type": "rename", "from": "cell_type"},
+    },
+    "computed": {
+        "pt_root_id": "pt_root_id",
+        "classification_system": "classification_system",
+        "cell_type": lambda row: row["cell_type"],
+    },
+}
+
+
+def _population(client, schema_name, cell_type):
+    config = TypedConnectivityConfig(
+        fake_config(ct_conn_cell_type_schema={"cell_type_local": SCHEMAS[schema_name]})
+    )
+    return PopulationData(
+        None,
+        client,
+        config,
+        CELL_TYPE_TABLE,
+        schema_name="cell_type_local",
+        source_cell_type=cell_type,
+    )
+
+
+def check_schemas(client, tables, cell_type):
+    """Compare source neurons and cell type matrices across schemas to the table"""
+    ct_df = tables[CELL_TYPE_TABLE]
+    expected = np.unique(ct_df.loc[ct_df["cell_type"] == cell_type, "pt_root_id"])
+    matrix = None
+    for schema_name in SCHEMAS:
+        pop = _population(client, schema_name, cell_type)
+        assert np.array_equal(pop.root_ids, expected), schema_name
+        if matrix is None:
+            matrix = pop.cell_type_matrix()
+        else:
+            pd.testing.assert_frame_equal(pop.cell_type_matrix(), matrix)
+    return len(expected)
+
+
+def run(n_syn=10_000, n_partners=2_000, n_roots=20, cell_type="5P-IT", repeat=3):
+    tables = make_tables(n_syn=n_syn, n_partners=n_partners, n_roots=n_roots)
+    client = FakeCAVEclient(tables)
+    with fake_backend(client):
+        n_sources = check_schemas(client, tables, cell_type)
+        timings = {
+            schema_name: median_time(
+                lambda: _population(client, schema_name, cell_type).cell_type_matrix(),
+                repeat,
+            )
+            for schema_name in SCHEMAS
+        }
+    return {"cell_type": cell_type, "sources": n_sources, **timings}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
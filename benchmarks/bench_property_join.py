@@ -0,0 +1,189 @@
+"""Property table aggregation and joins, against the per-table merge they replaced.
+
+Checks that _get_single_table and NeuronData._merge_property_tables give the same
+results as the earlier transform/drop_duplicates and merge/rename implementations,
+kept below as references, on fake tables with duplicated somas and partners missing
+from the property tables. Then times both on the partner tables and synapse
+dataframes of a neuron.
+
+Run with `python -m benchmarks.bench_property_join`.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.cell_type_connectivity.config import (
+    TypedConnectivityConfig,
+)
+from dash_connectivity_viewer.cell_type_connectivity.neuron_data_cortex import (
+    NeuronDataCortex,
+)
+from dash_connectivity_viewer.common.dataframe_utilities import (
+    _get_single_table,
+    property_select_columns,
+)
+
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    SOMA_TABLE,
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+from .timing import median_time
+
+
+def _reference_single_table(
+    table_name,
+    root_ids,
+    root_id_column,
+    include_columns,
+    aggregate_map,
+    client,
+    select_columns,
+):
+    keep_columns = include_columns.copy()
+    df = client.materialize.query_table(
+        table_name,
+        filter_in_dict={root_id_column: root_ids},
+        select_columns=select_columns,
+    )
+    for k, v in aggregate_map.items():
+        df[k] = df.groupby(v["group_by"])[v["column"]].transform(v["agg"])
+        keep_columns.append(k)
+    if len(aggregate_map) != 0:
+        df.loc[df.index[df.duplicated(root_id_column, False)], include_columns] = np.nan
+        df.drop_duplicates(root_id_column, keep="first", inplace=True)
+    else:
+        df.drop_duplicates(root_id_column, keep=False, inplace=True)
+    df.set_index(root_id_column, inplace=True)
+    return df[keep_columns]
+
+
+def _reference_merge(nrn, df, merge_column):
+    for tn in nrn.property_tables:
+        df = df.merge(
+            nrn.property_data(tn),
+            left_on=merge_column,
+            right_index=True,
+            how="left",
+            suffixes=("", nrn.property_column_suffix(tn)),
+        )
+        df.rename(
+            columns={
+                c: f"{c}{nrn.property_column_suffix(tn)}"
+                for c in nrn.property_columns(tn)
+                if f"{c}{nrn.property_column_suffix(tn)}" not in df.columns
+            },
+            inplace=True,
+        )
+    if nrn.soma_table is not None:
+        df[nrn.config.num_soma_col] = df[nrn.config.num_soma_col].fillna(0).astype(int)
+    return df
+
+
+def check_single_tables(nrn, client):
+    """Compare aggregated property tables to the reference for the partners of nrn"""
+    root_ids = nrn.partner_root_ids
+    for table_name, attrs in nrn._property_tables.items():
+        args = (
+            table_name,
+            root_ids,
+            attrs.get("root_id"),
+            attrs.get("include", []),
+            attrs.get("aggregate", {}),
+            client,
+        )
+        select_columns = property_select_columns(attrs)
+        pd.testing.assert_frame_equal(
+            _get_single_table(*args, None, select_columns=select_columns),
+            _reference_single_table(*args, select_columns),
+        )
+
+
+def check_merges(nrn):
+    """Compare property joins to the reference for partner and synapse dataframes"""
+    c = nrn.config
+    for df, merge_column in [
+        (nrn.partners_out(properties=False), c.root_id_col),
+        (nrn.partners_in(properties=False), c.root_id_col),
+        (nrn.pre_syn_df(), c.post_pt_root_id),
+        (nrn.post_syn_df(), c.pre_pt_root_id),
+    ]:
+        pd.testing.assert_frame_equal(
+            nrn._merge_property_tables(df.copy(), merge_column),
+            _reference_merge(nrn, df.copy(), merge_column),
+        )
+
+
+def run(n_syn=100_000, n_partners=10_000, repeat=5, seed=0):
+    tables = make_tables(n_syn=n_syn, n_partners=n_partners, seed=seed)
+    root_id = int(tables[SYNAPSE_TABLE]["pre_pt_root_id"].iloc[0])
+    client = FakeCAVEclient(tables)
+    config = TypedConnectivityConfig(fake_config())
+    with fake_backend(client):
+        nrn = NeuronDataCortex(
+            root_id,
+            client,
+            config,
+            cell_type_table=CELL_TYPE_TABLE,
+            schema_name="cell_type_local",
+        )
+        partners = pd.Series(nrn.partner_root_ids)
+        soma_roots = tables[SOMA_TABLE]["pt_root_id"]
+        cases = {
+            "partners": len(partners),
+            "duplicated_somas": int(
+                partners.isin(soma_roots[soma_roots.duplicated()]).sum()
+            ),
+            "partners_without_soma": int((~partners.isin(soma_roots)).sum()),
+        }
+        check_single_tables(nrn, client)
+        check_merges(nrn)
+
+        soma_args = (
+            SOMA_TABLE,
+            nrn.partner_root_ids,
+            config.soma_pt_root_id,
+            [config.soma_pt_position],
+            nrn._property_tables[SOMA_TABLE]["aggregate"],
+            client,
+        )
+        soma_columns = property_select_columns(nrn._property_tables[SOMA_TABLE])
+        timings = {
+            "soma_table": {
+                "transform": median_time(
+                    lambda: _reference_single_table(*soma_args, soma_columns), repeat
+                ),
+                "value_counts": median_time(
+                    lambda: _get_single_table(
+                        *soma_args, None, select_columns=soma_columns
+                    ),
+                    repeat,
+                ),
+            }
+        }
+
+        targ_df = nrn.partners_out(properties=False)
+        syn_df = nrn.pre_syn_df()
+        for label, df, merge_column in [
+            ("partners_out", targ_df, config.root_id_col),
+            ("pre_syn_df", syn_df, config.post_pt_root_id),
+        ]:
+            timings[label] = {
+                "merge": median_time(
+                    lambda: _reference_merge(nrn, df, merge_column), repeat
+                ),
+                "reindex": median_time(
+                    lambda: nrn._merge_property_tables(df, merge_column), repeat
+                ),
+            }
+    return {"n_syn": n_syn, "n_partners": n_partners, "cases": cases, **timings}
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
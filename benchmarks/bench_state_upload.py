@@ -0,0 +1,82 @@
+"""State id reuse by upload_state_cached, on the fake state server.
+
+Checks that identical neuroglancer states are uploaded once and get the same state
+id, that different states are uploaded separately, and that the same state is
+uploaded again to a state server at another address. Then times a cached lookup,
+which hashes the state instead of uploading it.
+
+Run with `python -m benchmarks.bench_state_upload`.
+"""
+
+import json
+
+import numpy as np
+
+from dash_connectivity_viewer.common.cache_utilities import (
+    LRUCache,
+    upload_state_cached,
+)
+
+from .fake_cave import FakeState
+from .timing import median_time
+
+
+def make_state(n_points=1_000, seed=0):
+    """Neuroglancer-like state with an annotation layer of n_points points"""
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 200_000, size=(n_points, 3))
+    return {
+        "layers": [
+            {"type": "image", "name": "img", "source": "precomputed://fake/image"},
+            {
+                "type": "annotation",
+                "name": "anno",
+                "annotations": [
+                    {"type": "point", "id": str(ii), "point": pt}
+                    for ii, pt in enumerate(points)
+                ],
+            },
+        ],
+        "navigation": {"pose": {"position": {"voxelCoordinates": points[0]}}},
+    }
+
+
+def check_uploads():
+    """Check state id reuse across identical states, different states and servers"""
+    cache = LRUCache(maxsize=16)
+    state_service = FakeState()
+
+    state_id = upload_state_cached(make_state(seed=0), state_service, cache=cache)
+    # Equal content built separately, with numpy arrays converted to lists
+    same_state = json.loads(json.dumps(make_state(seed=0), default=np.ndarray.tolist))
+    assert upload_state_cached(same_state, state_service, cache=cache) == state_id
+    assert len(state_service.uploads) == 1
+
+    other_id = upload_state_cached(make_state(seed=1), state_service, cache=cache)
+    assert other_id != state_id
+    assert len(state_service.uploads) == 2
+
+    other_server = FakeState()
+    other_server.server_address = "https://other.cave.local"
+    upload_state_cached(make_state(seed=0), other_server, cache=cache)
+    assert len(other_server.uploads) == 1
+    assert len(state_service.uploads) == 2
+    assert len(cache) == 3
+
+
+def run(n_points=10_000, repeat=5):
+    check_uploads()
+    state = make_state(n_points=n_points)
+    cache = LRUCache(maxsize=16)
+    state_service = FakeState()
+    upload_state_cached(state, state_service, cache=cache)
+    return {
+        "n_points": n_points,
+        "cached_lookup": median_time(
+            lambda: upload_state_cached(state, state_service, cache=cache), repeat
+        ),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
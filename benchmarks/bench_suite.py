@@ -0,0 +1,222 @@
+"""Timing benchmarks for the main data and rendering paths against the fake CAVE backend.
+
+Run with `python -m benchmarks.bench_suite --output results.json`. Passing a previous
+results file with `--compare` prints the ratio of new to old median times per benchmark.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.cell_type_connectivity.callbacks import make_plots
+from dash_connectivity_viewer.cell_type_connectivity.config import (
+    TypedConnectivityConfig,
+)
+from dash_connectivity_viewer.cell_type_connectivity.neuron_data_cortex import (
+    NeuronDataCortex,
+)
+from dash_connectivity_viewer.cell_type_table.config import CellTypeConfig
+from dash_connectivity_viewer.cell_type_table.table_lookup import TableViewer
+from dash_connectivity_viewer.common.cache_utilities import clear_shared_caches
+from dash_connectivity_viewer.common.link_utilities import (
+    generate_statebuider_syn_grouped,
+    generate_statebuilder_post,
+    generate_statebuilder_pre,
+)
+from dash_connectivity_viewer.common.neuron_data_base import NeuronData
+
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+from .timing import run_times
+
+# (synapses per direction, partners)
+SIZES = {
+    "small": (1_000, 10),
+    "medium": (10_000, 1_000),
+    "large": (100_000, 10_000),
+}
+
+
+def _info_cache(client, root_id):
+    info_cache = client.info.get_datastack_info()
+    info_cache["global_server"] = client.server_address
+    info_cache["root_id"] = str(root_id)
+    return info_cache
+
+
+def _timeit(func, repeat):
+    try:
+        func()
+    except Exception as e:
+        # Keep going so one broken stage does not hide the others
+        return {"error": f"{type(e).__name__}: {e}"}
+    times = run_times(func, repeat)
+    return {
+        "median": float(np.median(times)),
+        "min": float(np.min(times)),
+        "mean": float(np.mean(times)),
+        "repeat": repeat,
+    }
+
+
+def _uncached(func):
+    """Run func with empty shared caches, so data benchmarks time the queries"""
+
+    def wrapper():
+        clear_shared_caches()
+        return func()
+
+    return wrapper
+
+
+def _benchmarks(client, root_id):
+    """Named zero-argument callables, each running one stage from a fresh data object"""
+    config = TypedConnectivityConfig(fake_config())
+    ct_config = CellTypeConfig(fake_config())
+
+    def cortex_data():
+        return NeuronDataCortex(
+            root_id,
+            client,
+            config,
+            cell_type_table=CELL_TYPE_TABLE,
+            schema_name="cell_type_local",
+        )
+
+    # Loaded once for the rendering benchmarks, which should not time data queries
+    nrn = cortex_data()
+    pre_df = nrn.partners_out()
+    post_df = nrn.partners_in()
+    make_plots(nrn, config)
+    info_cache = _info_cache(client, root_id)
+    resolution = nrn.synapse_data_resolution
+
+    return {
+        "neuron_data_partners_out": _uncached(
+            lambda: NeuronData(
+                root_id, client, config, property_tables={}
+            ).partners_out()
+        ),
+        "neuron_data_cortex_partners_in_plus": _uncached(
+            lambda: cortex_data().partners_in_plus()
+        ),
+        "make_plots": lambda: make_plots(nrn, config),
+        "statebuilder_pre": lambda: generate_statebuilder_pre(
+            info_cache, config, data_resolution=resolution
+        ).render_state(pre_df, return_as="dict"),
+        "statebuilder_post": lambda: generate_statebuilder_post(
+            info_cache, config, data_resolution=resolution
+        ).render_state(post_df, return_as="dict"),
+        "statebuilder_syn_grouped": lambda: generate_statebuider_syn_grouped(
+            info_cache, "outputs", config, data_resolution=resolution
+        ).render_state(pre_df, return_as="dict"),
+        "table_viewer_table_data": _uncached(
+            lambda: TableViewer(
+                CELL_TYPE_TABLE, client, ct_config, use_cache=False
+            ).table_data()
+        ),
+    }
+
+
+def run(sizes=("small", "medium", "large"), repeat=5, seed=0):
+    results = []
+    for size in sizes:
+        n_syn, n_partners = SIZES[size]
+        tables = make_tables(n_syn=n_syn, n_partners=n_partners, seed=seed)
+        root_id = int(tables[SYNAPSE_TABLE]["pre_pt_root_id"].iloc[0])
+        client = FakeCAVEclient(tables)
+        with fake_backend(client):
+            for name, func in _benchmarks(client, root_id).items():
+                results.append(
+                    {
+                        "benchmark": name,
+                        "size": size,
+                        "n_syn": n_syn,
+                        "n_partners": n_partners,
+                        **_timeit(func, repeat),
+                    }
+                )
+    return results
+
+
+def _git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def compare(results, previous):
+    """Ratio of new to previous median time for benchmarks present in both"""
+    old = {
+        (r["benchmark"], r["size"]): r["median"]
+        for r in previous["results"]
+        if "median" in r
+    }
+    return [
+        {
+            "benchmark": r["benchmark"],
+            "size": r["size"],
+            "ratio": r["median"] / old[(r["benchmark"], r["size"])],
+        }
+        for r in results
+        if "median" in r and (r["benchmark"], r["size"]) in old
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Path to write JSON results to")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": run(args.sizes, args.repeat),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report["results"], json.load(f))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    for r in report["results"]:
+        if "error" in r:
+            print(f"{r['benchmark']} ({r['size']}) failed: {r['error']}")
+    print(
+        pd.DataFrame(report["results"])
+        .pivot(index="benchmark", columns="size", values="median")
+        .to_string(float_format="{:.4f}".format)
+    )
+    if "comparison" in report:
+        print(
+            pd.DataFrame(report["comparison"])
+            .pivot(index="benchmark", columns="size", values="ratio")
+            .to_string(float_format="{:.2f}".format)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Deterministic in-memory stand-in for the parts of CAVEclient used by the viewers.
+
+Tables are synthetic pandas dataframes laid out like the materialization service
+returns them, so the library code paths run unchanged against them.
+"""
+
+import datetime
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer.common import lookup_utilities
+from dash_connectivity_viewer.common.cache_utilities import clear_shared_caches
+
+DATASTACK = "fake_datastack"
+SERVER_ADDRESS = "https://fake.cave.local"
+SYNAPSE_TABLE = "synapses"
+SOMA_TABLE = "nucleus"
+CELL_TYPE_TABLE = "cell_types"
+VOXEL_RESOLUTION = [4, 4, 40]
+CELL_TYPES = {
+    "aibs_coarse_excitatory": ["23P", "4P", "5P-IT", "5P-ET", "6P-IT"],
+    "aibs_coarse_inhibitory": ["BC", "MC", "BPC", "NGC"],
+}
+
+
+def _positions(rng, n, depth_range=(300, 1200)):
+    """Random voxel positions with depth (in microns) inside depth_range"""
+    x = rng.integers(100_000, 200_000, n)
+    y = (rng.uniform(*depth_range, n) * 1_000 / VOXEL_RESOLUTION[1]).astype(int)
+    z = rng.integers(15_000, 25_000, n)
+    return list(np.stack([x, y, z], axis=1))
+
+
+def make_tables(
+    n_syn=10_000,
+    n_partners=1_000,
+    root_id=864691135000000000,
+    seed=0,
+    n_roots=None,
+):
+    """Build synthetic synapse, nucleus and cell type tables around one or more neurons.
+
+    Parameters
+    ----------
+    n_syn : int, optional
+        Number of synapses per direction per neuron, by default 10,000.
+    n_partners : int, optional
+        Number of distinct synaptic partners, by default 1,000.
+    root_id : int, optional
+        Root id of the first neuron. Further neurons have consecutive ids.
+    seed : int, optional
+        Random seed, by default 0.
+    n_roots : int, optional
+        Number of neurons with synapses, by default 1.
+
+    Returns
+    -------
+    dict
+        Table name to dataframe.
+    """
+    rng = np.random.default_rng(seed)
+    n_roots = n_roots or 1
+    roots = root_id + np.arange(n_roots)
+    partners = root_id + 1_000_000 + np.arange(n_partners)
+
+    syn_dfs = []
+    for ii, rid in enumerate(roots):
+        partner_weights = rng.pareto(1.5, n_partners) + 1
+        partner_weights /= partner_weights.sum()
+        for direction in ["pre", "post"]:
+            other = rng.choice(partners, size=n_syn, p=partner_weights)
+            own = np.full(n_syn, rid)
+            syn_dfs.append(
+                pd.DataFrame(
+                    {
+                        "valid": True,
+                        "pre_pt_supervoxel_id": rng.integers(1, 2**60, n_syn),
+                        "pre_pt_root_id": own if direction == "pre" else other,
+                        "post_pt_supervoxel_id": rng.integers(1, 2**60, n_syn),
+                        "post_pt_root_id": other if direction == "pre" else own,
+                        "size": rng.integers(50, 20_000, n_syn),
+                        "pre_pt_position": _positions(rng, n_syn),
+                        "ctr_pt_position": _positions(rng, n_syn),
+                        "post_pt_position": _positions(rng, n_syn),
+                    }
+                )
+            )
+    syn_df = pd.concat(syn_dfs, ignore_index=True)
+    syn_df.insert(0, "id", np.arange(len(syn_df)) + 1)
+
+    cells = np.concatenate([roots, partners])
+    has_soma = rng.random(len(cells)) < 0.8
+    has_soma[:n_roots] = True
+    soma_roots = cells[has_soma]
+    # A few merged cells with two nuclei
+    soma_roots = np.concatenate(
+        [soma_roots, soma_roots[rng.random(len(soma_roots)) < 0.01]]
+    )
+    nuc_df = pd.DataFrame(
+        {
+            "id": np.arange(len(soma_roots)) + 1,
+            "valid": True,
+            "volume": rng.uniform(100, 500, len(soma_roots)),
+            "pt_supervoxel_id": rng.integers(1, 2**60, len(soma_roots)),
+            "pt_root_id": soma_roots,
+            "pt_position": _positions(rng, len(soma_roots)),
+        }
+    )
+
+    typed_roots = soma_roots[rng.random(len(soma_roots)) < 0.9]
+    systems = rng.choice(list(CELL_TYPES), len(typed_roots), p=[0.8, 0.2])
+    types = [rng.choice(CELL_TYPES[s]) for s in systems]
+    ct_df = pd.DataFrame(
+        {
+            "id": np.arange(len(typed_roots)) + 1,
+            "valid": True,
+            "classification_system": systems,
+            "cell_type": types,
+            "pt_supervoxel_id": rng.integers(1, 2**60, len(typed_roots)),
+            "pt_root_id": typed_roots,
+            "pt_position": _positions(rng, len(typed_roots)),
+        }
+    )
+    return {SYNAPSE_TABLE: syn_df, SOMA_TABLE: nuc_df, CELL_TYPE_TABLE: ct_df}
+
+
+def _split_positions(df):
+    for col in [c for c in df.columns if c.endswith("_position")]:
+        pts = np.vstack(df[col].values) if len(df) > 0 else np.zeros((0, 3), int)
+        for ii, ax in enumerate(["x", "y", "z"]):
+            df[f"{col}_{ax}"] = pts[:, ii]
+        df = df.drop(columns=[col])
+    return df
+
+
+class FakeMaterialize(object):
+    """Serves query_table from in-memory dataframes and records bytes decoded per request.
+
+    Parameters
+    ----------
+    tables : dict
+        Table name to dataframe, as from make_tables.
+    version : int, optional
+        Materialization version to report, by default 1.
+    ignore_select_columns : bool, optional
+        If True, always return every column, emulating requests without column projection.
+    latency : float, optional
+        Seconds to sleep per query, emulating server round trip time. By default 0.
+    """
+
+    def __init__(self, tables, version=1, ignore_select_columns=False, latency=0):
+        self.tables = tables
+        self.version = version
+        self.ignore_select_columns = ignore_select_columns
+        self.latency = latency
+        self.requests = []
+
+    @property
+    def bytes_decoded(self):
+        return sum(r["bytes"] for r in self.requests)
+
+    def reset(self):
+        self.requests = []
+
+    def get_tables(self, *args, **kwargs):
+        return list(self.tables.keys())
+
+    def get_table_metadata(self, table_name, *args, **kwargs):
+        schema = "cell_type_local" if table_name == CELL_TYPE_TABLE else table_name
+        return {"schema": schema, "schema_type": schema}
+
+    def get_versions(self, *args, **kwargs):
+        return [self.version]
+
+    def most_recent_version(self, *args, **kwargs):
+        return self.version
+
+    def get_timestamp(self, *args, **kwargs):
+        return datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def query_table(
+        self,
+        table,
+        filter_in_dict=None,
+        filter_out_dict=None,
+        filter_equal_dict=None,
+        select_columns=None,
+        split_positions=False,
+        timestamp=None,
+        limit=None,
+        **kwargs,
+    ):
+        if self.latency:
+            import time
+
+            time.sleep(self.latency)
+        df = self.tables[table]
+        mask = np.full(len(df), True)
+        for k, v in (filter_in_dict or {}).items():
+            mask &= df[k].isin(np.atleast_1d(v)).values
+        for k, v in (filter_out_dict or {}).items():
+            mask &= ~df[k].isin(np.atleast_1d(v)).values
+        for k, v in (filter_equal_dict or {}).items():
+            mask &= (df[k] == v).values
+        df = df[mask]
+        if limit is not None:
+            df = df.iloc[:limit]
+        if select_columns is not None and not self.ignore_select_columns:
+            df = df[list(select_columns)]
+        df = df.reset_index(drop=True)
+        if split_positions:
+            df = _split_positions(df)
+        df.attrs["table_voxel_resolution"] = VOXEL_RESOLUTION
+        self.requests.append(
+            {
+                "table": table,
+                "rows": len(df),
+                "bytes": int(df.memory_usage(index=True, deep=True).sum()),
+            }
+        )
+        return df
+
+    def live_query(self, table, timestamp, **kwargs):
+        return self.query_table(table, timestamp=timestamp, **kwargs)
+
+
+class FakeChunkedgraph(object):
+    """Root id history for tables in a FakeMaterialize, edited with merge"""
+
+    def __init__(self, materialize):
+        self.materialize = materialize
+        self.edits = []
+        self.requests = []
+
+    def merge(self, old_roots, new_root, timestamp=None):
+        """Replace old_roots with new_root in all tables, as a proofreading edit would"""
+        if timestamp is None:
+            timestamp = datetime.datetime.utcnow()
+        for df in self.materialize.tables.values():
+            for col in [c for c in df.columns if c.endswith("_root_id")]:
+                df.loc[df[col].isin(old_roots), col] = new_root
+        self.edits.append((timestamp, np.asarray(old_roots), new_root))
+
+    def get_delta_roots(self, timestamp_past, timestamp_future=None):
+        self.requests.append("get_delta_roots")
+        old, new = [], []
+        for ts, old_roots, new_root in self.edits:
+            if timestamp_past < ts and (
+                timestamp_future is None or ts <= timestamp_future
+            ):
+                old.extend(old_roots)
+                new.append(new_root)
+        return np.array(old, dtype=np.int64), np.array(new, dtype=np.int64)
+
+    def get_roots(self, supervoxel_ids, timestamp=None):
+        self.requests.append("get_roots")
+        syn_df = self.materialize.tables[SYNAPSE_TABLE]
+        sv_to_root = pd.concat(
+            [
+                pd.Series(
+                    syn_df[f"{side}_pt_root_id"].values,
+                    index=syn_df[f"{side}_pt_supervoxel_id"].values,
+                )
+                for side in ["pre", "post"]
+            ]
+        )
+        sv_to_root = sv_to_root[~sv_to_root.index.duplicated()]
+        return sv_to_root.loc[np.asarray(supervoxel_ids)].values
+
+
+class FakeInfo(object):
+    def __init__(self):
+        self.info_cache = {
+            DATASTACK: {
+                "aligned_volume": {"image_source": "precomputed://fake/image"},
+                "segmentation_source": "graphene://fake/seg",
+                "synapse_table": SYNAPSE_TABLE,
+                "soma_table": SOMA_TABLE,
+                "viewer_site": "https://ngl.fake.local",
+                "viewer_resolution_x": VOXEL_RESOLUTION[0],
+                "viewer_resolution_y": VOXEL_RESOLUTION[1],
+                "viewer_resolution_z": VOXEL_RESOLUTION[2],
+            }
+        }
+
+    def get_datastack_info(self, *args, **kwargs):
+        return dict(self.info_cache[DATASTACK])
+
+    def viewer_site(self, *args, **kwargs):
+        return self.info_cache[DATASTACK]["viewer_site"]
+
+
+class FakeState(object):
+    server_address = SERVER_ADDRESS
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_state_json(self, state):
+        self.uploads.append(state)
+        return len(self.uploads)
+
+    def build_neuroglancer_url(self, state_id, ngl_url=None):
+        return f"{ngl_url}/?json_url={SERVER_ADDRESS}/nglstate/api/v1/{state_id}"
+
+
+class FakeAuth(object):
+    token = "fake-token"
+
+
+class FakeCAVEclient(object):
+    """Minimal CAVEclient stand-in backed by FakeMaterialize"""
+
+    def __init__(self, tables=None, **kwargs):
+        if tables is None:
+            tables = make_tables()
+        self.datastack_name = DATASTACK
+        self.server_address = SERVER_ADDRESS
+        self.materialize = FakeMaterialize(tables, **kwargs)
+        self.chunkedgraph = FakeChunkedgraph(self.materialize)
+        self.info = FakeInfo()
+        self.state = FakeState()
+        self.auth = FakeAuth()
+
+
+@contextmanager
+def fake_backend(client):
+    """Route every CAVEclient the viewers create to client while active, starting
+    and ending with empty shared caches"""
+    original = lookup_utilities.CAVEclient
+    lookup_utilities.CAVEclient = lambda *args, **kwargs: client
+    clear_shared_caches()
+    try:
+        yield client
+    finally:
+        lookup_utilities.CAVEclient = original
+        clear_shared_caches()
+
+
+def fake_config(**kwargs):
+    """Viewer config dict pointing at the fake datastack"""
+    config = {
+        "datastack": DATASTACK,
+        "server_address": SERVER_ADDRESS,
+        "synapse_table": SYNAPSE_TABLE,
+        "nucleus_table": SOMA_TABLE,
+        "syn_position_column": "ctr_pt",
+        "synapse_aggregation_rules": {
+            "mean_size": {"column": "size", "agg": "mean"},
+            "net_size": {"column": "size", "agg": "sum"},
+        },
+        "ct_cell_type_schema": {"cell_type_local": None},
+        "ct_conn_cell_type_schema": {"cell_type_local": None},
+        "valence_map": {
+            CELL_TYPE_TABLE: {
+                "column": "classification_system",
+                "e": "aibs_coarse_excitatory",
+                "i": "aibs_coarse_inhibitory",
+            }
+        },
+    }
+    config.update(kwargs)
+    return config
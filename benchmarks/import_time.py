@@ -0,0 +1,116 @@
+"""Cold-start cost of each app: import time per top-level package from
+`python -X importtime`, and the time to build the app with create_app, each measured
+in a fresh interpreter.
+
+Run with `python -m benchmarks.import_time --repeat 5`. Passing `--top 20` lists more of
+the slowest top-level packages.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+APPS = ["connectivity_table", "cell_type_connectivity", "cell_type_table"]
+
+# Dependencies that should only be imported once a link or plot is requested
+DEFERRED_MODULES = ["seaborn", "nglui.statebuilder", "matplotlib"]
+
+_SCRIPT = """
+import sys, time, json
+t0 = time.perf_counter()
+from dash_connectivity_viewer.{app} import create_app
+t1 = time.perf_counter()
+from benchmarks.fake_cave import fake_config
+t2 = time.perf_counter()
+create_app(config=fake_config())
+t3 = time.perf_counter()
+deferred = {deferred!r}
+print(json.dumps({{
+    "import": t1 - t0,
+    "create_app": t3 - t2,
+    "loaded": [m for m in deferred if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Import seconds per top-level package from -X importtime output, summing the
+    self time of each of its modules"""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return dict(totals)
+
+
+def measure(app):
+    """Import and create_app timings for one app in a fresh interpreter"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            _SCRIPT.format(app=app, deferred=DEFERRED_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out = json.loads(result.stdout.strip().splitlines()[-1])
+    out["packages"] = parse_importtime(result.stderr)
+    return out
+
+
+def run(apps=APPS, repeat=3):
+    results = []
+    for app in apps:
+        runs = [measure(app) for _ in range(repeat)]
+        packages = pd.DataFrame([r["packages"] for r in runs]).median()
+        results.append(
+            {
+                "app": app,
+                "import": float(np.median([r["import"] for r in runs])),
+                "create_app": float(np.median([r["create_app"] for r in runs])),
+                "deferred_loaded": runs[-1]["loaded"],
+                "packages": packages.sort_values(ascending=False).to_dict(),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apps", nargs="+", default=APPS, choices=APPS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="Path to write JSON results to")
+    args = parser.parse_args()
+
+    results = run(args.apps, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    for r in results:
+        print(
+            f"\n{r['app']} | import {r['import']:.3f} s | create_app {r['create_app']:.3f} s"
+        )
+        if len(r["deferred_loaded"]) > 0:
+            print(f"Loaded at startup: {', '.join(r['deferred_loaded'])}")
+        top = list(r["packages"].items())[: args.top]
+        print(
+            pd.Series(dict(top), name="seconds").to_string(float_format="{:.3f}".format)
+        )
+
+
+if __name__ == "__main__":
+    main()
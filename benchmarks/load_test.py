@@ -0,0 +1,398 @@
+"""Concurrent load test of the Dash callbacks of each app against the fake CAVE backend.
+
+Each simulated user runs one session: a Submit for a randomly drawn neuron followed by
+the table, link and whole-population link callbacks that the browser would trigger,
+with each request sent through the Flask test client of an app built by create_app.
+
+Run with `python -m benchmarks.load_test --concurrency 1 4 8 --sessions 40`. With
+`--combined`, all apps are mounted in one server by create_combined_app and share caches.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dash_connectivity_viewer import (
+    cell_type_connectivity,
+    cell_type_table,
+    connectivity_table,
+)
+from dash_connectivity_viewer.combined_app import create_combined_app
+
+from .fake_cave import (
+    CELL_TYPE_TABLE,
+    DATASTACK,
+    SOMA_TABLE,
+    SYNAPSE_TABLE,
+    FakeCAVEclient,
+    fake_backend,
+    fake_config,
+    make_tables,
+)
+
+# Neuron size classes as (synapses per direction, partners)
+NEURON_SIZES = {
+    "small": (500, 100),
+    "medium": (5_000, 1_000),
+    "large": (50_000, 5_000),
+}
+ROOT_ID_BASE = 864691135000000000
+
+
+def mixed_tables(size_counts, seed=0):
+    """Tables holding neurons of several size classes.
+
+    Parameters
+    ----------
+    size_counts : dict
+        Size class name (a key of NEURON_SIZES) to number of neurons.
+
+    Returns
+    -------
+    dict
+        Table name to dataframe, as from make_tables.
+    dict
+        Size class name to list of root ids with synapses.
+    """
+    parts = []
+    roots = {}
+    for ii, (size, n_roots) in enumerate(size_counts.items()):
+        if n_roots == 0:
+            continue
+        n_syn, n_partners = NEURON_SIZES[size]
+        root_id = ROOT_ID_BASE + ii * 10_000_000
+        parts.append(
+            make_tables(
+                n_syn=n_syn,
+                n_partners=n_partners,
+                root_id=root_id,
+                seed=seed + ii,
+                n_roots=n_roots,
+            )
+        )
+        roots[size] = [root_id + jj for jj in range(n_roots)]
+    tables = {}
+    for table_name in [SYNAPSE_TABLE, SOMA_TABLE, CELL_TYPE_TABLE]:
+        df = pd.concat([p[table_name] for p in parts], ignore_index=True)
+        df["id"] = np.arange(len(df)) + 1
+        tables[table_name] = df
+    return tables, roots
+
+
+def _component_key(component_id, prop):
+    """Short name for a component property, using id_inner for url-state components"""
+    if component_id.startswith("{"):
+        component_id = json.loads(component_id)["id_inner"]
+    return f"{component_id}.{prop}"
+
+
+def _parse_id(component_id):
+    return json.loads(component_id) if component_id.startswith("{") else component_id
+
+
+class CallbackClient(object):
+    """Sends Dash callback requests by callback function name through the Flask test client.
+
+    Pass server and prefix to send requests to an app mounted under a combined server.
+    """
+
+    def __init__(self, app, server=None, prefix=""):
+        if server is None:
+            server = app.server
+        self.client = server.test_client()
+        self.url = f"{prefix}/_dash-update-component"
+        self.callbacks = {
+            v["callback"].__name__: (k, v) for k, v in app.callback_map.items()
+        }
+
+    def call(self, name, values, triggered):
+        """Run a callback with inputs and state taken from values.
+
+        Parameters
+        ----------
+        name : str
+            Name of the callback function.
+        values : dict
+            Current component values, keyed as "id.property". Updated in place with the outputs.
+        triggered : str
+            Key of the input that triggers the callback.
+
+        Returns
+        -------
+        bool
+            True if the request succeeded.
+        """
+        output_key, spec = self.callbacks[name]
+        outputs = [
+            {"id": _parse_id(o["id"]), "property": o["property"]}
+            for o in _split_outputs(output_key)
+        ]
+        body = {
+            "output": output_key,
+            "outputs": outputs if output_key.startswith("..") else outputs[0],
+            "inputs": [
+                {
+                    "id": _parse_id(i["id"]),
+                    "property": i["property"],
+                    "value": values.get(_component_key(i["id"], i["property"])),
+                }
+                for i in spec["inputs"]
+            ],
+            "state": [
+                {
+                    "id": _parse_id(s["id"]),
+                    "property": s["property"],
+                    "value": values.get(_component_key(s["id"], s["property"])),
+                }
+                for s in spec.get("state", [])
+            ],
+            "changedPropIds": [_changed_prop_id(spec, triggered)],
+        }
+        response = self.client.post(self.url, json=body)
+        if response.status_code == 204:
+            return True
+        if response.status_code != 200:
+            return False
+        for component_id, props in response.get_json()["response"].items():
+            for prop, value in props.items():
+                values[_component_key(component_id, prop)] = value
+        return True
+
+
+def _split_outputs(output_key):
+    """Output id and property pairs from a Dash callback map key"""
+    parts = (
+        output_key.strip(".").split("...")
+        if output_key.startswith("..")
+        else [output_key]
+    )
+    outputs = []
+    for part in parts:
+        component_id, prop = part.rsplit(".", 1)
+        outputs.append({"id": component_id, "property": prop})
+    return outputs
+
+
+def _changed_prop_id(spec, triggered):
+    for i in spec["inputs"]:
+        if _component_key(i["id"], i["property"]) == triggered:
+            return f"{i['id']}.{i['property']}"
+    raise ValueError(f"{triggered} is not an input")
+
+
+def _connectivity_session(root_id, cell_type_table=None):
+    values = {
+        "datastack.value": DATASTACK,
+        "anno-id.value": str(root_id),
+        "cell-id-type.value": "root_id",
+        "id-type.value": "root_id",
+        "live-query-toggle.value": [],
+        "cell-type-table-dropdown.value": cell_type_table,
+        "submit-button.n_clicks": 1,
+        "connectivity-tab.value": "tab-pre",
+        "all-output-link-button.n_clicks": 1,
+        "all-output-link-button.children": "Generate Link",
+    }
+    steps = [
+        ("update_data", "submit-button.n_clicks"),
+        ("update_table", "connectivity-tab.value"),
+        ("update_link", "data-table.derived_virtual_selected_rows"),
+        ("generate_all_output_link", "all-output-link-button.n_clicks"),
+    ]
+    return values, steps
+
+
+def _cell_type_table_session(root_id):
+    values = {
+        "datastack.value": DATASTACK,
+        "cell-type-table-menu.value": CELL_TYPE_TABLE,
+        "anno-id.value": "",
+        "id-type.value": "root_id",
+        "cell-type.value": "",
+        "live-query-toggle.value": [],
+        "submit-button.n_clicks": 1,
+        "whole-table-link-button.n_clicks": 1,
+    }
+    steps = [
+        ("update_table", "submit-button.n_clicks"),
+        ("update_link", "data-table.derived_virtual_selected_rows"),
+        ("update_whole_table_link", "whole-table-link-button.n_clicks"),
+    ]
+    return values, steps
+
+
+APPS = {
+    "connectivity_table": (connectivity_table.create_app, _connectivity_session),
+    "cell_type_connectivity": (
+        cell_type_connectivity.create_app,
+        lambda rid: _connectivity_session(rid, cell_type_table=CELL_TYPE_TABLE),
+    ),
+    "cell_type_table": (cell_type_table.create_app, _cell_type_table_session),
+}
+
+
+def _run_session(app, session, root_id, server=None, prefix=""):
+    client = CallbackClient(app, server=server, prefix=prefix)
+    values, steps = session(root_id)
+    records = []
+    for name, triggered in steps:
+        if name == "update_link":
+            rows = values.get("data-table.data") or []
+            values["data-table.derived_virtual_data"] = rows
+            values["data-table.derived_virtual_selected_rows"] = list(
+                range(min(len(rows), 5))
+            )
+        t0 = time.perf_counter()
+        ok = client.call(name, values, triggered)
+        records.append(
+            {"callback": name, "latency": time.perf_counter() - t0, "ok": ok}
+        )
+    return records
+
+
+def _summarize(records, elapsed, n_sessions):
+    df = pd.DataFrame(records)
+    summary = []
+    for name, grp in df.groupby("callback", sort=False):
+        lat = grp["latency"].values
+        summary.append(
+            {
+                "callback": name,
+                "requests": len(grp),
+                "errors": int((~grp["ok"]).sum()),
+                "p50": float(np.percentile(lat, 50)),
+                "p95": float(np.percentile(lat, 95)),
+                "p99": float(np.percentile(lat, 99)),
+            }
+        )
+    return {
+        "elapsed": elapsed,
+        "sessions_per_s": n_sessions / elapsed,
+        "requests_per_s": len(df) / elapsed,
+        "callbacks": summary,
+    }
+
+
+def run(
+    app_names=tuple(APPS),
+    concurrency=(1, 4),
+    n_sessions=20,
+    size_weights={"small": 0.7, "medium": 0.25, "large": 0.05},
+    n_neurons=10,
+    latency=0,
+    seed=0,
+    combined=False,
+):
+    """Run the load test for each app and concurrency level.
+
+    Parameters
+    ----------
+    app_names : list of str, optional
+        Apps to test, keys of APPS.
+    concurrency : list of int, optional
+        Numbers of simultaneous sessions to run.
+    n_sessions : int, optional
+        Sessions per app and concurrency level.
+    size_weights : dict, optional
+        Relative frequency of each neuron size class among queried neurons.
+    n_neurons : int, optional
+        Neurons per size class in the fake tables.
+    latency : float, optional
+        Seconds of simulated server latency per materialization query.
+    seed : int, optional
+        Random seed for the tables and the neuron draw.
+    combined : bool, optional
+        If True, send requests to the apps mounted in one combined server.
+
+    Returns
+    -------
+    list of dict
+        One summary per app and concurrency level.
+    """
+    rng = np.random.default_rng(seed)
+    tables, roots = mixed_tables({size: n_neurons for size in size_weights}, seed=seed)
+    sizes = list(roots)
+    p = np.array([size_weights[s] for s in sizes], dtype=float)
+    drawn_sizes = rng.choice(sizes, size=n_sessions, p=p / p.sum())
+    root_ids = [int(rng.choice(roots[s])) for s in drawn_sizes]
+
+    client = FakeCAVEclient(tables, latency=latency)
+    results = []
+    with fake_backend(client):
+        if combined:
+            server = create_combined_app({name: fake_config() for name in app_names})
+        for app_name in app_names:
+            create_app, session = APPS[app_name]
+            if combined:
+                prefix, app = server.extensions["dcv_apps"][app_name]
+            else:
+                server, prefix = None, ""
+                app = create_app(config=fake_config())
+            for n_workers in concurrency:
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(n_workers) as exe:
+                    jobs = [
+                        exe.submit(_run_session, app, session, rid, server, prefix)
+                        for rid in root_ids
+                    ]
+                    records = [r for job in jobs for r in job.result()]
+                summary = _summarize(records, time.perf_counter() - t0, n_sessions)
+                results.append({"app": app_name, "concurrency": n_workers, **summary})
+    return results
+
+
+def _parse_weights(text):
+    weights = {}
+    for term in text.split(","):
+        size, weight = term.split(":")
+        weights[size] = float(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument(
+        "--sizes",
+        type=_parse_weights,
+        default="small:0.7,medium:0.25,large:0.05",
+        help="Neuron size distribution as class:weight pairs",
+    )
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument(
+        "--combined", action="store_true", help="Mount all apps in one server"
+    )
+    parser.add_argument("--output", help="Path to write JSON results to")
+    args = parser.parse_args()
+
+    results = run(
+        args.apps,
+        args.concurrency,
+        args.sessions,
+        size_weights=args.sizes,
+        latency=args.latency,
+        combined=args.combined,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    for r in results:
+        print(
+            f"\n{r['app']} | concurrency {r['concurrency']} | "
+            f"{r['sessions_per_s']:.2f} sessions/s, {r['requests_per_s']:.2f} requests/s"
+        )
+        print(
+            pd.DataFrame(r["callbacks"])
+            .set_index("callback")
+            .to_string(float_format="{:.3f}".format)
+        )
+
+
+if __name__ == "__main__":
+    main()
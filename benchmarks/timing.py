@@ -0,0 +1,20 @@
+"""Timing helpers shared by the benchmarks, so they all measure the same way."""
+
+import time
+
+import numpy as np
+
+
+def run_times(func, repeat):
+    """Wall clock seconds of repeat calls of func"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def median_time(func, repeat):
+    """Median wall clock seconds of repeat calls of func"""
+    return float(np.median(run_times(func, repeat)))
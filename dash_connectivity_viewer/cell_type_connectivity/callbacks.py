@@ -22,9 +22,17 @@ from ..common.dash_url_helper import _COMPONENT_ID_TYPE
 from ..common.lookup_utilities import (
     get_type_tables,
     make_client,
+    table_metadata,
 )
 from ..common.dataframe_utilities import stringify_root_ids
 from .neuron_data_cortex import NeuronDataCortex as NeuronData
+from .neuron_data_cortex import _schema_property_table, cell_type_catalogue
+from .population_data import PopulationData
+from ..common.timing_utilities import timed, register_request_timing
+from ..common.warmup_utilities import register_warmup
+from ..common.version_utilities import configure_version_watcher
+from ..common.prefetch_utilities import prefetch_partners
+from ..common.admission_utilities import admit
 from .cortex_panels import *
 
 try:
@@ -35,6 +43,7 @@ except:
 
 InputDatastack = Input({"id_inner": "datastack", "type": _COMPONENT_ID_TYPE}, "value")
 OutputDatastack = Output({"id_inner": "datastack", "type": _COMPONENT_ID_TYPE}, "value")
+StateDatastack = State({"id_inner": "datastack", "type": _COMPONENT_ID_TYPE}, "value")
 
 StateRootID = State({"id_inner": "anno-id", "type": _COMPONENT_ID_TYPE}, "value")
 StateCellTypeTable = State(
@@ -51,6 +60,12 @@ OutputCellTypeValue = Output(
 )
 
 StateAnnoType = State({"id_inner": "id-type", "type": _COMPONENT_ID_TYPE}, "value")
+StatePopulationCellType = State(
+    {"id_inner": "population-cell-type", "type": _COMPONENT_ID_TYPE}, "value"
+)
+StatePopulationDirection = State(
+    {"id_inner": "population-direction", "type": _COMPONENT_ID_TYPE}, "value"
+)
 StateLiveQuery = State(
     {"id_inner": "live-query-toggle", "type": _COMPONENT_ID_TYPE}, "value"
 )
@@ -67,7 +82,7 @@ OutputLiveQueryValue = Output(
 def cell_type_column_lookup(ct, schema_lookup, client):
     if ct is None:
         return {}
-    schema = client.materialize.get_table_metadata(ct)["schema"]
+    schema = table_metadata(client, ct)["schema"]
     return schema_lookup.get(schema)
 
 
@@ -105,6 +120,7 @@ def generic_syn_link_generation(
     return html.A(link_text, href=url, target="_blank", style={"font-size": "20px"})
 
 
+@timed("make_plots")
 def make_plots(ndat, config):
     if ndat is None:
         return html.Div("")
@@ -165,6 +181,25 @@ def make_plots(ndat, config):
 def register_callbacks(app, config):
 
     c = TypedConnectivityConfig(config)
+    register_request_timing(app, c)
+    configure_version_watcher(c)
+
+    def preload_table(client, table_name):
+        # Fills the cell type catalogue used by the bar plots
+        valence_map = c.table_valence_map.get(table_name)
+        cell_type_catalogue(
+            table_name,
+            _schema_property_table(
+                c, schema_name=table_metadata(client, table_name)["schema_type"]
+            ),
+            c.ct_conn_cell_type_column,
+            valence_map["column"] if valence_map else None,
+            client,
+        )
+
+    register_warmup(
+        app, c, schemata=c.allowed_cell_type_schema, preload_table=preload_table
+    )
 
     @app.callback(
         Output("data-table", "selected_rows"),
@@ -247,7 +282,7 @@ def register_callbacks(app, config):
 
         try:
             client = make_client(datastack_name, c.server_address)
-            info_cache = client.info.info_cache[datastack_name]
+            info_cache = dict(client.info.info_cache[datastack_name])
             info_cache["global_server"] = client.server_address
         except Exception as e:
             return (
@@ -260,7 +295,7 @@ def register_callbacks(app, config):
                 "Input",
                 1,
                 EMPTY_INFO_CACHE,
-                make_plots(None),
+                make_plots(None, c),
                 None,
             )
 
@@ -306,9 +341,7 @@ def register_callbacks(app, config):
 
         try:
             if ct_table_value:
-                schema_name = client.materialize.get_table_metadata(ct_table_value)[
-                    "schema_type"
-                ]
+                schema_name = table_metadata(client, ct_table_value)["schema_type"]
             else:
                 schema_name = None
 
@@ -326,56 +359,58 @@ def register_callbacks(app, config):
             root_id = nrn_data.root_id
             info_cache["root_id"] = str(root_id)
 
-            pre_targ_df = nrn_data.partners_out_plus()
-            pre_targ_df = stringify_root_ids(
-                pre_targ_df, stringify_cols=[c.root_id_col]
-            )
-
-            post_targ_df = nrn_data.partners_in_plus()
-            post_targ_df = stringify_root_ids(
-                post_targ_df, stringify_cols=[c.root_id_col]
-            )
-
-            n_syn_pre = pre_targ_df[c.num_syn_col].sum()
-            n_syn_post = post_targ_df[c.num_syn_col].sum()
-            syn_resolution = nrn_data.synapse_data_resolution
-
-            if logger is not None:
-                logger.info(
-                    f"Data update for {root_id} | time:{time.time() - t0:.2f} s, syn_in: {len(pre_targ_df)} , syn_out: {len(post_targ_df)}"
+            with admit(nrn_data, c):
+                pre_targ_df = nrn_data.partners_out_plus()
+                pre_targ_df = stringify_root_ids(
+                    pre_targ_df, stringify_cols=[c.root_id_col]
                 )
-            if nrn_data.nucleus_id is not None and nrn_data.soma_table is not None:
-                nuc_id_text = f"  (nucleus id: {nrn_data.nucleus_id})"
-            else:
-                nuc_id_text = ""
-            if ct_table_value:
-                ct_text = f"table {ct_table_value}"
-            else:
-                ct_text = "no cell type table"
 
-            if live_query:
-                message_text = f"Current connectivity for root id {root_id}{nuc_id_text} and {ct_text}"
-            else:
-                message_text = f"Connectivity for root id {root_id}{nuc_id_text} and {ct_text} materialized on {timestamp_ngl:%m/%d/%Y} (v{client.materialize.version})"
+                post_targ_df = nrn_data.partners_in_plus()
+                post_targ_df = stringify_root_ids(
+                    post_targ_df, stringify_cols=[c.root_id_col]
+                )
 
-            plts = make_plots(nrn_data, c)
+                n_syn_pre = pre_targ_df[c.num_syn_col].sum()
+                n_syn_post = post_targ_df[c.num_syn_col].sum()
+                syn_resolution = nrn_data.synapse_data_resolution
+                prefetch_partners(nrn_data, [pre_targ_df, post_targ_df], c)
 
-            del nrn_data
-            del client
+                if logger is not None:
+                    logger.info(
+                        f"Data update for {root_id} | time:{time.time() - t0:.2f} s, syn_in: {len(pre_targ_df)} , syn_out: {len(post_targ_df)}"
+                    )
+                if nrn_data.nucleus_id is not None and nrn_data.soma_table is not None:
+                    nuc_id_text = f"  (nucleus id: {nrn_data.nucleus_id})"
+                else:
+                    nuc_id_text = ""
+                if ct_table_value:
+                    ct_text = f"table {ct_table_value}"
+                else:
+                    ct_text = "no cell type table"
 
-            return (
-                html.Div(message_text),
-                "success",
-                "",
-                pre_targ_df.to_dict("records"),
-                post_targ_df.to_dict("records"),
-                f"Output (n = {n_syn_pre})",
-                f"Input (n = {n_syn_post})",
-                1,
-                info_cache,
-                plts,
-                syn_resolution,
-            )
+                if live_query:
+                    message_text = f"Current connectivity for root id {root_id}{nuc_id_text} and {ct_text}"
+                else:
+                    message_text = f"Connectivity for root id {root_id}{nuc_id_text} and {ct_text} materialized on {timestamp_ngl:%m/%d/%Y} (v{client.materialize.version})"
+
+                plts = make_plots(nrn_data, c)
+
+                del nrn_data
+                del client
+
+                return (
+                    html.Div(message_text),
+                    "success",
+                    "",
+                    pre_targ_df.to_dict("records"),
+                    post_targ_df.to_dict("records"),
+                    f"Output (n = {n_syn_pre})",
+                    f"Input (n = {n_syn_post})",
+                    1,
+                    info_cache,
+                    plts,
+                    syn_resolution,
+                )
         except Exception as e:
             return (
                 html.Div(str(e)),
@@ -667,6 +702,83 @@ def register_callbacks(app, config):
             return not is_open
         return is_open
 
+    @app.callback(
+        Output("population-plot-content", "children"),
+        Input("population-button", "n_clicks"),
+        StateDatastack,
+        StateRootID,
+        StateAnnoType,
+        StateCellTypeTable,
+        StatePopulationCellType,
+        StatePopulationDirection,
+        StateLiveQuery,
+        prevent_initial_call=True,
+    )
+    def update_population_matrix(
+        _,
+        datastack_name,
+        anno_id,
+        id_type,
+        ct_table_value,
+        source_cell_type,
+        direction,
+        query_toggle,
+    ):
+        if not allowed_action_trigger(callback_context, ["population-button"]):
+            return ""
+        if not ct_table_value:
+            return html.Div("Please select a cell type table")
+        if not source_cell_type and not anno_id:
+            return html.Div("Please enter a source cell type or a list of cell ids")
+
+        try:
+            client = make_client(datastack_name, c.server_address)
+            if len(query_toggle) == 1 and not c.disallow_live_query:
+                timestamp = datetime.datetime.utcnow()
+            else:
+                timestamp = None
+            schema_name = table_metadata(client, ct_table_value)["schema_type"]
+            if source_cell_type:
+                object_ids = None
+            else:
+                object_ids = [int(x) for x in anno_id.split(",") if x.strip()]
+
+            pop_data = PopulationData(
+                object_ids,
+                client,
+                c,
+                cell_type_table=ct_table_value,
+                schema_name=schema_name,
+                source_cell_type=source_cell_type if source_cell_type else None,
+                direction=direction,
+                timestamp=timestamp,
+                id_type="nucleus" if id_type == "nucleus_id" else "root",
+            )
+            ct_matrix = pop_data.cell_type_matrix()
+        except Exception as e:
+            return html.Div(str(e))
+
+        if ct_matrix.size == 0:
+            return html.Div("No synapses found for these neurons")
+        return html.Div(
+            [
+                html.Div(
+                    f"{len(pop_data.root_ids)} source neurons, {ct_matrix.values.sum()} synapses"
+                ),
+                dcc.Graph(figure=cell_type_matrix_fig(ct_matrix)),
+            ]
+        )
+
+    @app.callback(
+        Output("population-collapse", "is_open"),
+        Input("population-collapse-button", "n_clicks"),
+        State("population-collapse", "is_open"),
+    )
+    def toggle_population_collapse(n, is_open):
+        if n:
+            return not is_open
+        return is_open
+
     @app.callback(
         Output("plot-collapse", "is_open"),
         Input("plot-collapse-button", "n_clicks"),
@@ -677,4 +789,4 @@ def register_callbacks(app, config):
             return not is_open
         return is_open
 
-    pass
\ No newline at end of file
+    pass
@@ -1,9 +1,41 @@
 import numpy as np
-import seaborn as sns
 import pandas as pd
 import os
 import pathlib
+from functools import lru_cache
 from ..common.config import CommonConfig, bound_pt_position, bound_pt_root_id
+from ..common.import_utilities import lazy_module
+
+seaborn = lazy_module("seaborn")
+
+DATA_PATH = pathlib.Path(os.path.dirname(__file__)).parent.joinpath("common/data")
+LAYER_LABELS = ["L1", "L2/3", "L4", "L5", "L6", "WM"]
+
+
+@lru_cache(maxsize=None)
+def load_depth_bounds(version="v1"):
+    """Layer boundaries and overall height range in microns, read once per process.
+
+    Returns
+    -------
+    np.ndarray
+        Depths of the boundaries between consecutive layers.
+    np.ndarray
+        Top and bottom depth of the cortical column.
+    """
+    layer_bnds = np.load(f"{DATA_PATH}/layer_bounds_{version}.npy")
+    height_bnds = np.load(f"{DATA_PATH}/height_bounds_{version}.npy")
+    # Shared across config instances, so guard against accidental edits
+    layer_bnds.setflags(write=False)
+    height_bnds.setflags(write=False)
+    return layer_bnds, height_bnds
+
+
+@lru_cache(maxsize=None)
+def color_palette(name, n_colors):
+    """RGB colors of a seaborn palette as a tuple, built once per process"""
+    return tuple(seaborn.color_palette(name, n_colors=n_colors))
+
 
 ####################
 ### Column names ###
@@ -34,9 +66,12 @@ class VisConfig:
         self.dendrite_color = dendrite_color
         self.axon_color = axon_color
 
-        self.e_colors = sns.color_palette(e_palette, n_colors=n_e_colors)
-        self.i_colors = sns.color_palette(i_palette, n_colors=n_i_colors)
-        self.u_colors = sns.color_palette(u_palette, n_colors=n_u_colors)
+        # Palettes are built on first use, so that seaborn is not loaded at startup
+        self._palettes = {
+            "e": (e_palette, n_e_colors),
+            "i": (i_palette, n_i_colors),
+            "u": (u_palette, n_u_colors),
+        }
         self.base_ind = base_ind
 
         self.e_string = e_string
@@ -50,6 +85,18 @@ class VisConfig:
         self.ticklocs = tick_locs
         self.tick_labels = tick_labels
 
+    @property
+    def e_colors(self):
+        return color_palette(*self._palettes["e"])
+
+    @property
+    def i_colors(self):
+        return color_palette(*self._palettes["i"])
+
+    @property
+    def u_colors(self):
+        return color_palette(*self._palettes["u"])
+
     @property
     def clrs(self):
         return np.array([self.axon_color, self.dendrite_color])
@@ -70,27 +117,24 @@ class VisConfig:
     def valence_colors(self):
         return np.vstack([self.e_color, self.i_color, self.u_color])
 
+    def valence_codes(self, is_inhib):
+        """Valence of each value as 0 for unknown (missing), 1 for excitatory (false)
+        and 2 for inhibitory (true)"""
+        is_inhib = pd.Series(is_inhib, copy=False)
+        missing = is_inhib.isna().values
+        inhib = is_inhib.where(~missing, False).astype(bool).values
+        return np.where(missing, 0, np.where(inhib, 2, 1))
+
     def valence_color_map(self, is_inhib):
-        cmap = []
-        for x in is_inhib:
-            if pd.isna(x):
-                cmap.append(2)
-            elif x:
-                cmap.append(0)
-            else:
-                cmap.append(1)
-        return np.array(cmap)
+        return np.array([2, 1, 0])[self.valence_codes(is_inhib)]
 
     def valence_string_map(self, is_inhib):
-        smap = []
-        for x in is_inhib:
-            if pd.isna(x):
-                smap.append(self.u_string)
-            elif x:
-                smap.append(self.i_string)
-            else:
-                smap.append(self.e_string)
-        return smap
+        """Categorical of the valence string of each value, with categories ordered
+        unknown, excitatory, inhibitory"""
+        return pd.Categorical.from_codes(
+            self.valence_codes(is_inhib),
+            categories=[self.u_string, self.e_string, self.i_string],
+        )
 
 
 class TypedConnectivityConfig(CommonConfig):
@@ -103,6 +147,8 @@ class TypedConnectivityConfig(CommonConfig):
 
         self.soma_depth_column = config.get("ct_conn_soma_depth_column", "soma_depth")
         self.synapse_depth_column = config.get("ct_conn_syn_depth_column", "syn_depth")
+        self.soma_layer_column = config.get("ct_conn_soma_layer_column", "soma_layer")
+        self.synapse_layer_column = config.get("ct_conn_syn_layer_column", "syn_layer")
         self.is_inhibitory_column = config.get(
             "ct_conn_is_inhibitory_column", "is_inhibitory"
         )
@@ -128,12 +174,18 @@ class TypedConnectivityConfig(CommonConfig):
 
         self.show_plots = config.get("ct_conn_show_plots", True)
         self.show_depth_plots = config.get("ct_conn_show_depth_plots", True)
+        # If None, raw synapse depths are sent to the browser for Violin traces
+        self.violin_density_bins = config.get("ct_conn_violin_density_bins", 100)
+        # Above this many synapses, the depth scatter plot is decimated
+        self.scatter_max_points = config.get("ct_conn_scatter_max_points", 10_000)
+        self.scatter_decimation = config.get("ct_conn_scatter_decimation", "subsample")
+        self.scatter_density_bins = config.get("ct_conn_scatter_density_bins", 50)
+        self.population_property_chunk = config.get(
+            "ct_conn_population_property_chunk", 10_000
+        )
 
-        # Next thing to fix!
-        base_dir = pathlib.Path(os.path.dirname(__file__))
-        data_path = base_dir.parent.joinpath("common/data")
-        self.layer_bnds = np.load(f"{data_path}/layer_bounds_v1.npy")
-        self.height_bnds = np.load(f"{data_path}/height_bounds_v1.npy")
+        self.layer_bnds, self.height_bnds = load_depth_bounds()
+        self.layer_labels = LAYER_LABELS
         ticklocs = np.concatenate(
             [self.height_bnds[0:1], self.layer_bnds, self.height_bnds[1:]]
         )
@@ -159,5 +211,5 @@ class TypedConnectivityConfig(CommonConfig):
             u_color_palette,
             base_ind=base_ind,
             tick_locs=ticklocs,
-            tick_labels=["L1", "L2/3", "L4", "L5", "L6", "WM", ""],
+            tick_labels=LAYER_LABELS + [""],
         )
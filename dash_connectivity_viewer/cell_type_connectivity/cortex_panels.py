@@ -70,13 +70,17 @@ def violin_fig(ndat, height=350, width=200):
 
     fig = go.Figure()
 
-    violin_post = post_violin_plot(ndat)
-    violin_pre = pre_violin_plot(ndat)
-    fig.add_trace(violin_post)
-    fig.add_trace(violin_pre)
+    if ndat.config.violin_density_bins:
+        fig.add_traces(density_violin_plots(ndat, ndat.config.violin_density_bins))
+        fig.update_xaxes(showticklabels=False, zeroline=False, range=[-1.05, 1.05])
+    else:
+        violin_post = post_violin_plot(ndat)
+        violin_pre = pre_violin_plot(ndat)
+        fig.add_trace(violin_post)
+        fig.add_trace(violin_pre)
 
     fig.update_layout(
-        yaxis_title="Synapse Depth",
+        yaxis_title="Synapse Depth (in/out per layer)",
         height=height,
         width=width,
         paper_bgcolor="White",
@@ -87,7 +91,7 @@ def violin_fig(ndat, height=350, width=200):
 
     fig.update_yaxes(
         tickvals=ndat.config.vis.ticklocs,
-        ticktext=ndat.config.vis.tick_labels,
+        ticktext=layer_count_labels(ndat),
         ticklabelposition="outside bottom",
         range=ndat.config.height_bnds.astype(int)[::-1].tolist(),
         gridcolor="#CCC",
@@ -103,6 +107,9 @@ def scatter_fig(ndat, width=350, height=350):
         ndat,
         ndat.config.synapse_depth_column,
         ndat.config.soma_depth_column,
+        max_points=ndat.config.scatter_max_points,
+        decimation=ndat.config.scatter_decimation,
+        density_bins=ndat.config.scatter_density_bins,
     )
     fig.add_traces(scatter)
 
@@ -137,3 +144,29 @@ def scatter_fig(ndat, width=350, height=350):
         scaleratio=1,
     )
     return fig
+
+
+def cell_type_matrix_fig(cell_type_matrix, height=500, width=600):
+
+    fig = go.Figure(
+        go.Heatmap(
+            z=cell_type_matrix.values,
+            x=cell_type_matrix.columns.astype(str),
+            y=cell_type_matrix.index.astype(str),
+            colorscale="Blues",
+            colorbar=dict(title="Synapses"),
+            hovertemplate="%{y} → %{x}: %{z} synapses<extra></extra>",
+        )
+    )
+
+    fig.update_layout(
+        xaxis_title="Target Cell Type",
+        yaxis_title="Source Cell Type",
+        height=height,
+        width=width,
+        paper_bgcolor="White",
+        template="plotly_white",
+        margin=dict(l=20, r=20, t=20, b=20),
+    )
+    fig.update_yaxes(autorange="reversed")
+    return fig
@@ -1,11 +1,14 @@
 import plotly.graph_objects as go
 import numpy as np
+import pandas as pd
 
+from ..common.dataframe_utilities import stratified_downsample
 
-def _violin_plot(syn_df, x_col, y_col, name, side, color, xaxis, yaxis):
+
+def _violin_plot(depths, name, side, color, xaxis, yaxis):
     return go.Violin(
-        x=syn_df[x_col],
-        y=syn_df[y_col],
+        x=np.zeros(len(depths), dtype=int),
+        y=depths,
         side=side,
         scalegroup="syn",
         name=name,
@@ -23,9 +26,7 @@ def post_violin_plot(
     yaxis=None,
 ):
     return _violin_plot(
-        ndat.syn_all_df().query('direction == "post"'),
-        x_col="x",
-        y_col=ndat.config.synapse_depth_column,
+        ndat._post_syn_view()[ndat.config.synapse_depth_column].values,
         name="Post",
         side="negative",
         color=ndat.config.vis.dendrite_color,
@@ -40,9 +41,7 @@ def pre_violin_plot(
     yaxis=None,
 ):
     return _violin_plot(
-        ndat.syn_all_df().query('direction == "pre"'),
-        x_col="x",
-        y_col=ndat.config.synapse_depth_column,
+        ndat._pre_syn_view()[ndat.config.synapse_depth_column].values,
         name="Pre",
         side="positive",
         color=ndat.config.vis.axon_color,
@@ -51,27 +50,206 @@ def pre_violin_plot(
     )
 
 
+# Binomial smoothing of the depth histogram, approximating a narrow Gaussian KDE
+_DENSITY_KERNEL = np.array([1, 4, 6, 4, 1]) / 16
+
+
+def depth_density(depths, bins):
+    """Smoothed synapse counts per depth bin, ignoring missing depths.
+
+    Parameters
+    ----------
+    depths : array-like
+        Synapse depths.
+    bins : np.ndarray
+        Bin edges.
+
+    Returns
+    -------
+    np.ndarray
+        Bin centers.
+    np.ndarray
+        Smoothed counts per bin.
+    """
+    depths = np.asarray(depths, dtype=float)
+    counts, _ = np.histogram(depths[~np.isnan(depths)], bins=bins)
+    smoothed = np.convolve(counts, _DENSITY_KERNEL, mode="same")
+    return (bins[1:] + bins[:-1]) / 2, smoothed
+
+
+def depth_bins(height_bnds, n_bins, *depths):
+    """Bin edges of n_bins equal bins over the height range, extended by whole bins
+    on either side to cover any depths outside of it.
+
+    Parameters
+    ----------
+    height_bnds : array-like
+        Lower and upper bound of the height range.
+    n_bins : int
+        Number of bins over the height range.
+    *depths : array-like
+        Depths that must fall inside the bins. Missing depths are ignored.
+
+    Returns
+    -------
+    np.ndarray
+        Bin edges.
+    """
+    lower, upper = float(height_bnds[0]), float(height_bnds[1])
+    width = (upper - lower) / n_bins
+    values = np.concatenate([np.asarray(d, dtype=float) for d in depths] + [[]])
+    values = values[np.isfinite(values)]
+    n_below, n_above = 0, 0
+    if len(values) > 0:
+        n_below = max(int(np.ceil((lower - values.min()) / width)), 0)
+        # The last bin is closed, so depths on the upper edge need no extra bin
+        n_above = max(int(np.ceil((values.max() - upper) / width)), 0)
+    return lower + width * np.arange(-n_below, n_bins + n_above + 1)
+
+
+def _density_plot(centers, widths, bins, name, side, color):
+    """Filled half-violin outline from precomputed widths, anchored at x=0"""
+    sign = 1 if side == "positive" else -1
+    return go.Scatter(
+        x=np.concatenate([[0], sign * widths, [0]]),
+        y=np.concatenate([bins[:1], centers, bins[-1:]]),
+        fill="toself",
+        mode="lines",
+        name=name,
+        line_color=f"rgb{color}",
+        fillcolor=f"rgb{color}",
+        hoverinfo="name",
+    )
+
+
+def density_violin_plots(ndat, n_bins):
+    """Post and pre half violins computed server-side on fixed bins over the height
+    range, extended to cover any synapse depths outside of it. Each side is scaled
+    to its own maximum, like Violin traces with their own scalegroup."""
+    depth_column = ndat.config.synapse_depth_column
+    post_depths = ndat._post_syn_view()[depth_column].values
+    pre_depths = ndat._pre_syn_view()[depth_column].values
+    bins = depth_bins(ndat.config.height_bnds, n_bins, post_depths, pre_depths)
+    centers, post = depth_density(post_depths, bins)
+    _, pre = depth_density(pre_depths, bins)
+    return [
+        _density_plot(
+            centers,
+            post / max(post.max(initial=0), 1),
+            bins,
+            "Post",
+            "negative",
+            ndat.config.vis.dendrite_color,
+        ),
+        _density_plot(
+            centers,
+            pre / max(pre.max(initial=0), 1),
+            bins,
+            "Pre",
+            "positive",
+            ndat.config.vis.axon_color,
+        ),
+    ]
+
+
+def layer_count_labels(ndat):
+    """Layer tick labels annotated with input/output synapse counts per layer"""
+    if ndat.config.synapse_depth_column is None:
+        return ndat.config.vis.tick_labels
+    counts = ndat.layer_synapse_counts()
+    labels = [
+        f"{layer}<br><sub>{row.post}/{row.pre}</sub>"
+        for layer, row in zip(counts.index, counts.itertuples())
+    ]
+    return labels + ndat.config.vis.tick_labels[len(labels) :]
+
+
+def binned_points(x, y, bins, bounds):
+    """Centers and counts of the non-empty cells of a square 2D histogram.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Point coordinates.
+    bins : int
+        Number of bins along each axis.
+    bounds : tuple
+        Lower and upper edge of the bins along both axes.
+
+    Returns
+    -------
+    np.ndarray
+        x coordinate of the center of each non-empty cell.
+    np.ndarray
+        y coordinate of the center of each non-empty cell.
+    np.ndarray
+        Number of points in each non-empty cell.
+    """
+    edges = np.linspace(*bounds, bins + 1)
+    counts, _, _ = np.histogram2d(x, y, bins=[edges, edges])
+    centers = (edges[1:] + edges[:-1]) / 2
+    ix, iy = np.nonzero(counts)
+    return centers[ix], centers[iy], counts[ix, iy].astype(int)
+
+
+def _scatter_bounds(ndat, soma_depth, syn_depth):
+    lower, upper = ndat.config.height_bnds
+    if len(soma_depth) > 0:
+        lower = min(lower, soma_depth.min(), syn_depth.min())
+        upper = max(upper, soma_depth.max(), syn_depth.max())
+    return lower, upper
+
+
 def synapse_soma_scatterplot(
     ndat,
     syn_depth_column,
     soma_depth_column,
     xaxis=None,
     yaxis=None,
+    max_points=None,
+    decimation="subsample",
+    density_bins=50,
 ):
+    """Synapse depth against target soma depth, with a trace per target valence.
+
+    Above max_points synapses, the points are decimated so that the figure stays small.
+    With decimation "subsample", a deterministic sample of max_points synapses is shown,
+    keeping the proportion of each valence. With "density", each trace has a marker
+    per non-empty cell of a density_bins x density_bins histogram, sized by its count.
+    """
     drop_columns = [syn_depth_column, soma_depth_column]
     targ_df = ndat.pre_syn_df_plus().dropna(subset=drop_columns)
 
-    inhibitory_string_column = "inhib_string_column"
-    targ_df[inhibitory_string_column] = ndat.config.vis.valence_string_map(
+    valence = ndat.config.vis.valence_string_map(
         targ_df[ndat.config.is_inhibitory_column]
     )
+    soma_depth = targ_df[soma_depth_column].values.astype(float)
+    syn_depth = targ_df[syn_depth_column].values.astype(float)
+
+    decimate = max_points is not None and len(targ_df) > max_points
+    if decimate and decimation == "subsample":
+        sample = stratified_downsample(
+            pd.DataFrame(
+                {"valence": valence, "id": targ_df[ndat.config.syn_id_col].values}
+            ),
+            max_points,
+            strata_column="valence",
+            key_columns=["id"],
+        )
+        inds = sample.index.values
+        valence, soma_depth, syn_depth = (
+            valence[inds],
+            soma_depth[inds],
+            syn_depth[inds],
+        )
+    elif decimate and decimation == "density":
+        bounds = _scatter_bounds(ndat, soma_depth, syn_depth)
+    elif decimate:
+        raise ValueError('decimation must be either "subsample" or "density"')
+    # Row positions of each valence, in one pass
+    rows = pd.Series(valence).groupby(valence, observed=True).indices
 
     panels = []
-    valence_order = [
-        ndat.config.vis.u_string,
-        ndat.config.vis.e_string,
-        ndat.config.vis.i_string,
-    ]
     color_order = [
         ndat.config.vis.u_color,
         ndat.config.vis.e_color,
@@ -83,21 +261,33 @@ def synapse_soma_scatterplot(
         ndat.config.vis.i_opacity,
     ]
 
-    for val, color, alpha in zip(valence_order, color_order, opacity_order):
-        targ_df_r = targ_df.query(f"{inhibitory_string_column}=='{val}'")
+    for val, color, alpha in zip(valence.categories, color_order, opacity_order):
+        inds = rows.get(val, np.array([], dtype=int))
+        marker = dict(
+            color=f"rgb{_format_color(color)}",
+            line_width=0,
+            size=5,
+            opacity=alpha,
+        )
+        if decimate and decimation == "density":
+            x, y, counts = binned_points(
+                soma_depth[inds], syn_depth[inds], density_bins, bounds
+            )
+            marker["size"] = np.round(3 + 2 * np.sqrt(counts), 1)
+            marker["sizemode"] = "diameter"
+            hover = dict(text=counts, hovertemplate="%{text} synapses")
+        else:
+            x, y = soma_depth[inds], syn_depth[inds]
+            hover = {}
         panel = go.Scattergl(
-            x=targ_df_r[soma_depth_column],
-            y=targ_df_r[syn_depth_column],
+            x=x,
+            y=y,
             mode="markers",
-            marker=dict(
-                color=f"rgb{_format_color(color)}",
-                line_width=0,
-                size=5,
-                opacity=alpha,
-            ),
+            marker=marker,
             xaxis=xaxis,
             yaxis=yaxis,
             name=val,
+            **hover,
         )
         panels.append(panel)
 
@@ -109,6 +299,8 @@ def bar_data(
     cell_type_column,
     num_syn_column,
 ):
+    if num_syn_column == ndat.config.num_syn_col:
+        return ndat.output_synapses_by_cell_type(cell_type_column)
     targ_df = ndat.partners_out().dropna(subset=[cell_type_column])
     return targ_df.groupby(cell_type_column)[num_syn_column].sum()
 
@@ -128,7 +320,7 @@ def _bar_plot(
 
 
 def _format_color(color, alpha=None):
-    color = tuple(np.floor(255 * np.array(color)).astype(int))
+    color = tuple(np.floor(255 * np.array(color)).astype(int).tolist())
     if alpha is None:
         return color
     else:
@@ -142,11 +334,12 @@ def _prepare_bar_plot(
     cell_types,
     valence,
 ):
+    bdat = bar_data(ndat, cell_type_column, ndat.config.num_syn_col)
+
     if valence == "u":
         if cell_types is None:
-            cell_types = np.unique(
-                ndat.property_data(ndat.cell_type_table)[cell_type_column]
-            )
+            # Live lookups can see cell types newer than the materialized catalogue
+            cell_types = np.union1d(ndat.cell_types(cell_type_column), bdat.index)
         name = "Targets"
     else:
         if valence == "i":
@@ -157,22 +350,13 @@ def _prepare_bar_plot(
             name = "E Targets"
 
         if cell_types is None:
-            cell_types = (
-                ndat.property_data(ndat.cell_type_table)
-                .groupby(ndat.valence_map["column"])
-                .agg({cell_type_column: np.unique})
-                .loc[ndat.valence_map[map_ind]][cell_type_column]
+            cell_types = ndat.cell_types(
+                cell_type_column, valence=ndat.valence_map[map_ind]
             )
 
-    bdat = bar_data(ndat, cell_type_column, ndat.config.num_syn_col)
-
     # Fill in any cell types in the table
-    for ct in cell_types:
-        if ct not in bdat.index:
-            bdat.loc[ct] = 0
-
     return _bar_plot(
-        bdat.sort_index().loc[cell_types],
+        bdat.reindex(cell_types, fill_value=0),
         name,
         _format_color(color),
     )
@@ -205,4 +389,4 @@ def uniform_bar_plot(
 ):
     return _prepare_bar_plot(
         ndat, cell_type_column, ndat.config.vis.u_color, cell_types, "u"
-    )
\ No newline at end of file
+    )
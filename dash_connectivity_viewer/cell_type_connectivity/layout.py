@@ -428,6 +428,85 @@ def page_layout(state: State = None):
         )
     )
 
+    population_data = dbc.Row(
+        dbc.Col(
+            html.Div(
+                [
+                    dbc.Button(
+                        html.H5(
+                            "Population Cell Type Matrix (click to toggle visibility)"
+                        ),
+                        id="population-collapse-button",
+                        color="secondary",
+                        className="d-grid gap-2 col-6 mx-auto",
+                    ),
+                    dbc.Collapse(
+                        [
+                            html.Br(),
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        [
+                                            html.Div(
+                                                "Source Cell Type (optional, otherwise uses Cell IDs):"
+                                            ),
+                                            dbc.Input(
+                                                **create_component_kwargs(
+                                                    state,
+                                                    id_inner="population-cell-type",
+                                                    value="",
+                                                    type="text",
+                                                )
+                                            ),
+                                        ],
+                                        width={"size": 3, "offset": 1},
+                                        align="end",
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            **create_component_kwargs(
+                                                state,
+                                                id_inner="population-direction",
+                                                options=[
+                                                    {
+                                                        "label": "Outputs",
+                                                        "value": "pre",
+                                                    },
+                                                    {
+                                                        "label": "Inputs",
+                                                        "value": "post",
+                                                    },
+                                                ],
+                                                value="pre",
+                                                clearable=False,
+                                            )
+                                        ),
+                                        width={"size": 1},
+                                        align="end",
+                                    ),
+                                    dbc.Col(
+                                        dbc.Button(
+                                            "Compute Matrix",
+                                            id="population-button",
+                                            color="primary",
+                                        ),
+                                        width={"size": 2},
+                                        align="end",
+                                    ),
+                                ],
+                                justify="start",
+                            ),
+                            html.Br(),
+                            dbc.Spinner(html.Div("", id="population-plot-content")),
+                        ],
+                        id="population-collapse",
+                        is_open=False,
+                    ),
+                ]
+            )
+        )
+    )
+
     layout = html.Div(
         children=[
             html.Div(header_text),
@@ -437,6 +516,8 @@ def page_layout(state: State = None):
             html.Hr(),
             html.Div(plot_data),
             html.Hr(),
+            html.Div(population_data),
+            html.Hr(),
             dbc.Container(cell_links),
             html.Hr(),
             top_link,
@@ -1,6 +1,14 @@
 import pandas as pd
 import numpy as np
+from dfbridge import DataframeBridge
+from ..common.cache_utilities import auth_scope, shared_cache
+from ..common.dataframe_utilities import property_select_columns
 from ..common.neuron_data_base import NeuronData
+from ..common.version_utilities import VERSION_WATCHER
+
+# Cell types of whole cell type tables at a fixed materialization version
+CELL_TYPE_CATALOGUE_CACHE = shared_cache("cell_type_catalogue", maxsize=32)
+VERSION_WATCHER.register_cache(CELL_TYPE_CATALOGUE_CACHE, lambda k: (k[0], k[1], k[3]))
 
 
 def _schema_property_table(config, schema_name=None):
@@ -19,6 +27,71 @@ def _cell_type_property_entry(cell_type_table, config, schema_name=None):
     return {cell_type_table: _schema_property_table(config, schema_name=schema_name)}
 
 
+def cell_type_catalogue(
+    cell_type_table,
+    property_entry,
+    cell_type_column,
+    valence_column,
+    client,
+    cache=None,
+):
+    """Cell types in a whole cell type table, overall and by valence, at the
+    materialization version of the client.
+
+    The table is queried once per version, with only the property columns.
+
+    Parameters
+    ----------
+    cell_type_table : str
+        Cell type table name.
+    property_entry : dict
+        Property table entry of the table, as from _schema_property_table.
+    cell_type_column : str
+        Column with cell types.
+    valence_column : str or None
+        Column with the valence of each cell type.
+    client : CAVEclient
+        Client for the datastack.
+    cache : LRUCache, optional
+        Cache of catalogues, by default CELL_TYPE_CATALOGUE_CACHE.
+
+    Returns
+    -------
+    dict
+        "all" holds the sorted unique cell types, "by_valence" a dict of valence value
+        to the sorted unique cell types with it.
+    """
+    if cache is None:
+        cache = CELL_TYPE_CATALOGUE_CACHE
+    key = (
+        client.server_address,
+        client.datastack_name,
+        cell_type_table,
+        client.materialize.version,
+        cell_type_column,
+        valence_column,
+        auth_scope(client),
+    )
+    catalogue = cache.get(key)
+    if catalogue is None:
+        df = client.materialize.query_table(
+            cell_type_table,
+            select_columns=property_select_columns(property_entry),
+        )
+        df = DataframeBridge(property_entry.get("table_bridge_schema")).reformat(df)
+        df = df.dropna(subset=[cell_type_column])
+        by_valence = {}
+        if valence_column is not None:
+            for valence, grp in df.groupby(valence_column):
+                by_valence[valence] = np.unique(grp[cell_type_column].values)
+        catalogue = {
+            "all": np.unique(df[cell_type_column].values),
+            "by_valence": by_valence,
+        }
+        cache.set(key, catalogue)
+    return catalogue
+
+
 def _is_inhibitory_df(df, is_inhibitory_column, valence_map):
     if len(df) == 0:
         df[is_inhibitory_column] = None
@@ -32,13 +105,12 @@ def _is_inhibitory_df(df, is_inhibitory_column, valence_map):
     if i_str:
         ei_str.append(i_str)
 
-    def _is_inhibitory_row(row):
-        if row[col] in ei_str:
-            return row[col] == i_str
-        else:
-            return np.nan
-
-    df[is_inhibitory_column] = df.apply(lambda x: _is_inhibitory_row(x), axis=1)
+    values = df[col].values
+    known = df[col].isin(ei_str).values
+    is_inhibitory = np.full(len(df), np.nan, dtype=object)
+    is_inhibitory[known] = values[known] == i_str
+    # Bool if every value is known, float if none is, as from a row-wise apply
+    df[is_inhibitory_column] = pd.Series(is_inhibitory, index=df.index).infer_objects()
     return df
 
 
@@ -49,14 +121,47 @@ def _compute_depth_y(xyz, data_resolution):
         return xyz[1] * data_resolution[1] / 1_000
 
 
-def _extract_depth(df, depth_column, position_column, data_resolution):
+def _position_y(positions):
+    """y coordinate of each position, with NaN where a position is missing"""
+    positions = list(positions)
+    try:
+        pts = np.vstack(positions)
+        if pts.shape == (len(positions), 3):
+            return pts[:, 1].astype(float)
+    except (ValueError, TypeError):
+        pass
+    return np.array(
+        [x[1] if np.ndim(x) == 1 and len(x) == 3 else np.nan for x in positions],
+        dtype=float,
+    )
+
+
+def layer_index(depth, layer_bnds):
+    """Index of the layer containing each depth (0 for L1), or -1 for missing depths"""
+    depth = np.asarray(depth, dtype=float)
+    return np.where(
+        np.isnan(depth), -1, np.searchsorted(layer_bnds, depth, side="right")
+    )
+
+
+def _extract_depth(
+    df,
+    depth_column,
+    position_column,
+    data_resolution,
+    layer_column=None,
+    layer_bnds=None,
+):
     if len(df) == 0:
         df[depth_column] = None
+        if layer_column is not None:
+            df[layer_column] = None
         return df
 
-    df[depth_column] = df[position_column].apply(
-        lambda x: _compute_depth_y(x, data_resolution)
-    )
+    depth = _position_y(df[position_column].values) * data_resolution[1] / 1_000
+    df[depth_column] = depth
+    if layer_column is not None:
+        df[layer_column] = layer_index(depth, layer_bnds)
     return df
 
 
@@ -83,6 +188,7 @@ class NeuronDataCortex(NeuronData):
         else:
             property_tables = dict()
         self.valence_map = config.table_valence_map.get(cell_type_table)
+        self._synapses_by_cell_type = {}
         super().__init__(
             object_id,
             client,
@@ -106,32 +212,32 @@ class NeuronDataCortex(NeuronData):
             else:
                 df[self.config.is_inhibitory_column] = np.nan
         if self.config.soma_depth_column is not None and self.soma_table is not None:
-            df = _extract_depth(
-                df,
-                self.config.soma_depth_column,
-                self.config.soma_position_agg,
-                self.property_data_resolution(self.soma_table),
-            )
+            df = self._extract_soma_depth(df)
         return df
 
+    def _extract_soma_depth(self, df):
+        return _extract_depth(
+            df,
+            self.config.soma_depth_column,
+            self.config.soma_position_agg,
+            self.property_data_resolution(self.soma_table),
+            layer_column=self.config.soma_layer_column,
+            layer_bnds=self.config.layer_bnds,
+        )
+
     def pre_syn_df_plus(self):
         return self._decorate_synapse_dataframe(
-            self.pre_syn_df(), self.config.post_pt_root_id
+            self._pre_syn_view().copy(deep=False), self.config.post_pt_root_id
         )
 
     def post_syn_df_plus(self):
         return self._decorate_synapse_dataframe(
-            self.post_syn_df(), self.config.pre_pt_root_id
+            self._post_syn_view().copy(deep=False), self.config.pre_pt_root_id
         )
 
     def _decorate_partner_dataframe(self, df):
         if self.config.soma_depth_column is not None and self.soma_table is not None:
-            df = _extract_depth(
-                df,
-                self.config.soma_depth_column,
-                self.config.soma_position_agg,
-                self.property_data_resolution(self.soma_table),
-            )
+            df = self._extract_soma_depth(df)
         if self.config.is_inhibitory_column is not None:
             if self.valence_map:
                 df = _is_inhibitory_df(
@@ -149,6 +255,44 @@ class NeuronDataCortex(NeuronData):
     def partners_out_plus(self):
         return self._decorate_partner_dataframe(self.partners_out())
 
+    def cell_types(self, cell_type_column, valence=None):
+        """Sorted cell types of the whole materialized cell type table, optionally only
+        those of one valence value, from a catalogue shared across lookups. Includes
+        types that no partner of this neuron has, so bar plots list every type."""
+        valence_column = self.valence_map["column"] if self.valence_map else None
+        catalogue = cell_type_catalogue(
+            self.cell_type_table,
+            self._property_tables[self.cell_type_table],
+            cell_type_column,
+            valence_column,
+            self.client,
+        )
+        if valence is None:
+            return catalogue["all"]
+        return catalogue["by_valence"].get(valence, np.array([], dtype=object))
+
+    def output_synapses_by_cell_type(self, cell_type_column):
+        """Number of output synapses onto partners of each cell type.
+
+        Computed once for all bar plots of the neuron, from synapse counts per partner
+        without building the full partner table.
+        """
+        if cell_type_column not in self._synapses_by_cell_type:
+            counts = self._pre_syn_view()[self.config.post_pt_root_id].value_counts()
+            targ_df = pd.DataFrame(
+                {
+                    self.config.root_id_col: counts.index.values,
+                    self.config.num_syn_col: counts.values,
+                }
+            )
+            targ_df = self._merge_property_tables(
+                targ_df, self.config.root_id_col
+            ).dropna(subset=[cell_type_column])
+            self._synapses_by_cell_type[cell_type_column] = targ_df.groupby(
+                cell_type_column
+            )[self.config.num_syn_col].sum()
+        return self._synapses_by_cell_type[cell_type_column].copy()
+
     def _get_syn_df(self):
         super()._get_syn_df()
         if self.config.synapse_depth_column is not None:
@@ -158,8 +302,25 @@ class NeuronDataCortex(NeuronData):
                     self.config.synapse_depth_column,
                     self.config.syn_pt_position,
                     self._synapse_data_resolution,
+                    layer_column=self.config.synapse_layer_column,
+                    layer_bnds=self.config.layer_bnds,
                 )
 
+    def layer_synapse_counts(self):
+        """Number of input and output synapses in each layer, from the layer index
+        computed when synapses are loaded."""
+        n_layers = len(self.config.layer_labels)
+        counts = {}
+        for direction, syn_df in [
+            ("post", self._post_syn_view()),
+            ("pre", self._pre_syn_view()),
+        ]:
+            layers = syn_df[self.config.synapse_layer_column].values.astype(int)
+            counts[direction] = np.bincount(layers[layers >= 0], minlength=n_layers)[
+                :n_layers
+            ]
+        return pd.DataFrame(counts, index=self.config.layer_labels)
+
     def soma_depth(self):
         return _compute_depth_y(
             self.soma_location(), self.property_data_resolution(self.soma_table)
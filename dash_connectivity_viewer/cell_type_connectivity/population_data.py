@@ -0,0 +1,240 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from dfbridge import DataframeBridge
+
+from ..common.dataframe_utilities import (
+    bridge_filter_column,
+    property_select_columns,
+    property_table_data,
+)
+from ..common.lookup_utilities import get_root_ids_from_nuc_ids, pooled_client
+from .neuron_data_cortex import _cell_type_property_entry
+
+
+def _edge_counts(synapse_table, root_ids, direction, client, timestamp, config):
+    """Synapse counts per (pre, post) root id pair for one chunk of neurons"""
+    own_column = config.pre_pt_root_id if direction == "pre" else config.post_pt_root_id
+    syn_df = client.materialize.query_table(
+        synapse_table,
+        filter_in_dict={own_column: list(root_ids)},
+        select_columns=[config.pre_pt_root_id, config.post_pt_root_id],
+        timestamp=timestamp,
+    )
+    syn_df = syn_df[syn_df[config.pre_pt_root_id] != syn_df[config.post_pt_root_id]]
+    return (
+        syn_df.groupby([config.pre_pt_root_id, config.post_pt_root_id])
+        .size()
+        .rename(config.num_syn_col)
+        .reset_index()
+    )
+
+
+class PopulationData(object):
+    """Cell type to cell type connectivity for a population of neurons.
+
+    Synapses are fetched in chunks of config.target_root_id_per_call neurons and reduced
+    to per-pair synapse counts as each chunk arrives, so raw synapse tables for the whole
+    population are never held in memory at once. Cell types are looked up once for all
+    neurons involved.
+
+    Parameters
+    ----------
+    object_ids : list or None
+        Root or nucleus ids of the source neurons. Ignored if source_cell_type is set.
+    client : CAVEclient
+        Client for the datastack.
+    config : TypedConnectivityConfig
+        App config.
+    cell_type_table : str
+        Cell type table used to label neurons.
+    schema_name : str, optional
+        Schema of the cell type table, used to look up the schema bridge.
+    source_cell_type : str, optional
+        If set, all neurons of this cell type in cell_type_table are the sources.
+    direction : str, optional
+        "pre" to aggregate outputs of the sources, "post" for inputs. By default "pre".
+    """
+
+    def __init__(
+        self,
+        object_ids,
+        client,
+        config,
+        cell_type_table,
+        schema_name=None,
+        source_cell_type=None,
+        direction="pre",
+        timestamp=None,
+        n_threads=None,
+        id_type="root",
+    ):
+        self._client = pooled_client(client, pool_maxsize=config.pool_maxsize)
+        self.config = config
+        self.cell_type_table = cell_type_table
+        self._property_tables = _cell_type_property_entry(
+            cell_type_table, config, schema_name=schema_name
+        )
+        self._bridge_schema = self._property_tables[cell_type_table].get(
+            "table_bridge_schema"
+        )
+        self.source_cell_type = source_cell_type
+        self.direction = direction
+        self._timestamp = timestamp
+        if n_threads is None:
+            n_threads = config.max_chunks
+        self.n_threads = n_threads
+
+        if config.synapse_table is None:
+            self._synapse_table = client.info.get_datastack_info().get("synapse_table")
+        else:
+            self._synapse_table = config.synapse_table
+        if config.soma_table is None:
+            self._soma_table = client.info.get_datastack_info().get("soma_table")
+        else:
+            self._soma_table = config.soma_table
+
+        self._object_ids = object_ids
+        self._id_type = id_type
+        self._root_ids = None
+        self._edge_df = None
+        self._cell_types = None
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def synapse_table(self):
+        return self._synapse_table
+
+    @property
+    def root_ids(self):
+        if self._root_ids is None:
+            if self.source_cell_type is not None:
+                self._root_ids = self._cell_type_root_ids(self.source_cell_type)
+            elif self._id_type == "nucleus":
+                self._root_ids = get_root_ids_from_nuc_ids(
+                    self._object_ids,
+                    self.client,
+                    self._soma_table,
+                    self.config,
+                    self.timestamp,
+                )
+            else:
+                self._root_ids = [int(x) for x in self._object_ids]
+        return self._root_ids
+
+    def _cell_type_root_ids(self, cell_type):
+        ct_column = self.config.ct_conn_cell_type_column
+        property_entry = self._property_tables[self.cell_type_table]
+        root_column = property_entry["root_id"]
+        source_column = bridge_filter_column(self._bridge_schema, ct_column)
+        if source_column is not None:
+            df = self.client.materialize.query_table(
+                self.cell_type_table,
+                filter_equal_dict={source_column: cell_type},
+                select_columns=[root_column],
+                timestamp=self.timestamp,
+            )
+            return np.unique(df[root_column].values).tolist()
+
+        # The cell type column is computed by the bridge, so filter after reformatting
+        select_columns = property_select_columns(property_entry)
+        if select_columns is not None and root_column not in select_columns:
+            select_columns = select_columns + [root_column]
+        df = self.client.materialize.query_table(
+            self.cell_type_table,
+            select_columns=select_columns,
+            timestamp=self.timestamp,
+        )
+        ct_df = DataframeBridge(self._bridge_schema).reformat(df)
+        is_type = (ct_df[ct_column] == cell_type).fillna(False).values.astype(bool)
+        return np.unique(df[root_column].values[is_type]).tolist()
+
+    def edge_counts(self):
+        """Synapse counts per connected (pre, post) root id pair"""
+        if self._edge_df is None:
+            self._edge_df = self._fetch_edge_counts()
+        return self._edge_df
+
+    def _fetch_edge_counts(self):
+        root_ids = np.unique(np.asarray(self.root_ids, dtype=np.int64))
+        n_chunks = max(
+            int(np.ceil(len(root_ids) / self.config.target_root_id_per_call)), 1
+        )
+        edge_dfs = []
+        with ThreadPoolExecutor(max(self.n_threads, 1)) as exe:
+            jobs = [
+                exe.submit(
+                    _edge_counts,
+                    self.synapse_table,
+                    chunk,
+                    self.direction,
+                    self.client,
+                    self.timestamp,
+                    self.config,
+                )
+                for chunk in np.array_split(root_ids, n_chunks)
+            ]
+            for job in as_completed(jobs):
+                edge_dfs.append(job.result())
+        edge_df = pd.concat(edge_dfs, ignore_index=True)
+        # Chunks are disjoint in the queried direction, so pairs are unique already
+        return edge_df
+
+    def cell_types(self):
+        """Cell type per root id for all sources and their partners"""
+        if self._cell_types is None:
+            self._cell_types = self._fetch_cell_types()
+        return self._cell_types
+
+    def _fetch_cell_types(self):
+        edge_df = self.edge_counts()
+        root_ids = np.unique(
+            np.concatenate(
+                [
+                    np.asarray(self.root_ids, dtype=np.int64),
+                    edge_df[self.config.pre_pt_root_id].values,
+                    edge_df[self.config.post_pt_root_id].values,
+                ]
+            )
+        )
+        chunk_size = self.config.population_property_chunk
+        n_chunks = max(int(np.ceil(len(root_ids) / chunk_size)), 1)
+        ct_dfs = []
+        for chunk in np.array_split(root_ids, n_chunks):
+            df = property_table_data(
+                chunk,
+                self._property_tables,
+                self.client,
+                self.timestamp,
+            )[self.cell_type_table]
+            ct_dfs.append(DataframeBridge(self._bridge_schema).reformat(df))
+        ct_df = pd.concat(ct_dfs)
+        return ct_df[self.config.ct_conn_cell_type_column]
+
+    def cell_type_matrix(self, unknown_label="Unknown"):
+        """Synapse counts between cell types, with source (pre) types as rows"""
+        edge_df = self.edge_counts()
+        cell_types = self.cell_types()
+        pre_type = (
+            edge_df[self.config.pre_pt_root_id].map(cell_types).fillna(unknown_label)
+        )
+        post_type = (
+            edge_df[self.config.post_pt_root_id].map(cell_types).fillna(unknown_label)
+        )
+        return (
+            edge_df.groupby([pre_type.values, post_type.values])[
+                self.config.num_syn_col
+            ]
+            .sum()
+            .unstack(fill_value=0)
+            .sort_index()
+            .sort_index(axis=1)
+        )
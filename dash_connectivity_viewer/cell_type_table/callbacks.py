@@ -1,6 +1,8 @@
 import flask
 import datetime
+import uuid
 from dash import callback_context
+from dash.exceptions import PreventUpdate
 from dash import dcc
 from dash import html
 from .config import CellTypeConfig
@@ -8,17 +10,21 @@ from .config import CellTypeConfig
 from dash.dependencies import Input, Output, State
 from ..common.dataframe_utilities import *
 from ..common.link_utilities import (
-    DEFAULT_NGL,
     generate_statebuilder,
     generate_url_cell_types,
     EMPTY_INFO_CACHE,
     MAX_URL_LENGTH,
+    state_server_url,
 )
 from ..common.lookup_utilities import (
     get_type_tables,
     make_client,
 )
-from .table_lookup import TableViewer
+from ..common.cache_utilities import shared_cache
+from ..common.timing_utilities import register_request_timing
+from ..common.warmup_utilities import register_warmup
+from ..common.version_utilities import configure_version_watcher
+from .table_lookup import TableViewer, pushdown_filters
 from .ct_utils import process_dataframe
 
 # Callbacks using data from URL-encoded parameters requires this import
@@ -67,6 +73,18 @@ def register_callbacks(app, config):
         Dict for standard parameter values
     """
     c = CellTypeConfig(config)
+    register_request_timing(app, c)
+    configure_version_watcher(c)
+
+    def preload_table(client, table_name):
+        # Fills the query cache entry used by an unfiltered lookup of the table
+        TableViewer(table_name, client, c).table_data()
+
+    register_warmup(
+        app, c, schemata=c.allowed_cell_type_schema, preload_table=preload_table
+    )
+    # Entries have unique keys, so apps in one process can share the cache
+    table_cache = shared_cache("cell_type_table", maxsize=c.table_cache_size)
 
     @app.callback(
         OutputDatastack,
@@ -116,32 +134,79 @@ def register_callbacks(app, config):
         Output("client-info-json", "data"),
         Output("message-text", "color"),
         Output("data-resolution-json", "data"),
+        Output("table-cache-key", "data"),
+        Output("pushdown-filter-json", "data"),
+        Output("query-params-json", "data"),
         Input("submit-button", "n_clicks"),
         InputDatastack,
+        Input("data-table", "filter_query"),
         StateCellTypeMenu,
         StateAnnoID,
         StateCategoryID,
         StateCellType,
         StateLiveQuery,
+        State("pushdown-filter-json", "data"),
+        State("query-params-json", "data"),
     )
     def update_table(
         clicks,
         datastack,
+        filter_query,
         cell_type_table,
         anno_id,
         id_type,
         cell_type,
         live_query_toggle,
+        last_pushdown,
+        query_params,
     ):
+        if c.filter_pushdown:
+            pushdown = pushdown_filters(
+                filter_query,
+                c.filter_pushdown_columns,
+                root_id_columns=["id", "pt_root_id"],
+            )
+        else:
+            pushdown = {}
+
+        ctx = callback_context
+        if ctx.triggered and ctx.triggered[0]["prop_id"] == "data-table.filter_query":
+            # Filters that cannot be pushed down are applied by the table itself
+            if query_params is None or pushdown == (last_pushdown or {}):
+                raise PreventUpdate
+            # Refresh the submitted query, not any unsubmitted edits to the form
+            cell_type_table = query_params["cell_type_table"]
+            anno_id = query_params["anno_id"]
+            id_type = query_params["id_type"]
+            cell_type = query_params["cell_type"]
+            live_query_toggle = query_params["live_query_toggle"]
+        query_params = {
+            "cell_type_table": cell_type_table,
+            "anno_id": anno_id,
+            "id_type": id_type,
+            "cell_type": cell_type,
+            "live_query_toggle": live_query_toggle,
+        }
+
         try:
             client = make_client(datastack, c.server_address)
-            info_cache = client.info.get_datastack_info()
+            info_cache = dict(client.info.get_datastack_info())
             info_cache["global_server"] = client.server_address
         except Exception as e:
-            return [], str(e), "", EMPTY_INFO_CACHE, "danger"
+            return [], str(e), "", EMPTY_INFO_CACHE, "danger", None, None, None, None
 
         if cell_type_table is None:
-            return [], "No Cell Type Table Selected", "", info_cache, "info"
+            return (
+                [],
+                "No Cell Type Table Selected",
+                "",
+                info_cache,
+                "info",
+                None,
+                None,
+                None,
+                None,
+            )
 
         if len(anno_id) == 0:
             anno_id = None
@@ -176,6 +241,7 @@ def register_callbacks(app, config):
                 id_query=anno_id,
                 id_query_type=anno_type_lookup[id_type],
                 column_query=annotation_filter,
+                filter_equal_query=pushdown,
                 timestamp=timestamp,
             )
             df = tv.table_data()
@@ -191,13 +257,21 @@ def register_callbacks(app, config):
             output_color = "danger"
 
         ct_df = stringify_root_ids(process_dataframe(df, "pt_root_id", "pt"))
+        records = ct_df.to_dict("records")
+
+        # Keep positions server-side so whole-table links skip the browser round trip
+        table_key = uuid.uuid4().hex
+        table_cache.set(table_key, assign_pt_position(ct_df, "pt_position"))
         return (
-            ct_df.to_dict("records"),
+            records,
             output_report,
             "",
             info_cache,
             output_color,
-            df.attrs["table_voxel_resolution"],
+            df.attrs.get("table_voxel_resolution"),
+            table_key,
+            pushdown,
+            query_params,
         )
 
     @app.callback(
@@ -236,7 +310,7 @@ def register_callbacks(app, config):
                 link_name = "State Too Large"
                 link_color = True
             else:
-                df["pt_position"] = df.apply(assemble_pt_position, axis=1)
+                df = assign_pt_position(df, "pt_position")
                 url = generate_url_cell_types(
                     selected_rows, df, info_cache, c, data_resolution=data_resolution
                 )
@@ -262,9 +336,12 @@ def register_callbacks(app, config):
         Input("client-info-json", "data"),
         InputDatastack,
         Input("data-resolution-json", "data"),
+        State("table-cache-key", "data"),
         prevent_initial_call=True,
     )
-    def update_whole_table_link(_1, _2, rows, info_cache, datastack, data_resolution):
+    def update_whole_table_link(
+        _1, _2, rows, info_cache, datastack, data_resolution, table_key
+    ):
         ctx = callback_context
         if not ctx.triggered:
             return ""
@@ -279,15 +356,23 @@ def register_callbacks(app, config):
         if rows is None or len(rows) == 0:
             return html.Div("No items to show"), "Error", True
 
-        df = pd.DataFrame(rows)
+        df = table_cache.get(table_key)
+        if df is None:
+            df = assign_pt_position(pd.DataFrame(rows), "pt_position")
+
         if len(df) > c.max_server_dataframe_length:
-            df = df.sample(c.max_server_dataframe_length)
+            # Deterministic so that repeated clicks give the same (cacheable) state
+            df = stratified_downsample(
+                df,
+                c.max_server_dataframe_length,
+                strata_column="cell_type",
+                key_columns=["id"],
+                seed=dataframe_seed(df, ["id"]),
+            )
             sampled = True
         else:
             sampled = False
 
-        df["pt_position"] = df.apply(assemble_pt_position, axis=1)
-
         if len(df) > c.max_dataframe_length:
             try:
                 client = make_client(datastack, c.server_address)
@@ -299,11 +384,7 @@ def register_callbacks(app, config):
                     return_as="dict",
                     data_resolution=data_resolution,
                 )
-                state_id = client.state.upload_state_json(state)
-                ngl_url = client.info.viewer_site()
-                if ngl_url is None:
-                    ngl_url = DEFAULT_NGL
-                url = client.state.build_neuroglancer_url(state_id, ngl_url=ngl_url)
+                url = state_server_url(state, client)
             except Exception as e:
                 return html.Div(str(e)), "Error", True
         else:
@@ -312,7 +393,7 @@ def register_callbacks(app, config):
             )
 
         if sampled:
-            link_text = f"Neuroglancer Link (State very large — Random {c.max_server_dataframe_length} shown)"
+            link_text = f"Neuroglancer Link (State very large — {len(df)} shown, sampled across all cell types)"
         else:
             link_text = f"Neuroglancer Link"
 
@@ -322,4 +403,4 @@ def register_callbacks(app, config):
             True,
         )
 
-    pass
\ No newline at end of file
+    pass
@@ -15,6 +15,12 @@ class CellTypeConfig(CommonConfig):
         self.ct_cell_type_root_id = bound_pt_root_id(self.ct_cell_type_point)
         self.omit_cell_type_tables = config.get("omit_cell_type_tables", [])
         self.cell_type_dropdown_options = config.get("cell_type_dropdown_options", [])
+        self.table_cache_size = config.get("ct_table_cache_size", 16)
+        self.filter_pushdown = config.get("ct_filter_pushdown", False)
+        self.filter_pushdown_columns = config.get(
+            "ct_filter_pushdown_columns",
+            ["id", "pt_root_id", "classification_system", "cell_type"],
+        )
         self.ct_table_columns = [
             "id",
             "pt_root_id",
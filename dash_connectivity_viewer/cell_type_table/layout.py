@@ -334,7 +334,10 @@ def page_layout(state: State = {}):
             html.Div(datastack_comp, style={"display": "none"}),
             dcc.Store(id="client-info-json"),
             dcc.Store(id="table-resolution-json"),
-            dcc.Store(id='data-resolution-json'),
+            dcc.Store(id="data-resolution-json"),
+            dcc.Store(id="table-cache-key"),
+            dcc.Store(id="pushdown-filter-json"),
+            dcc.Store(id="query-params-json"),
         ]
     )
     return layout
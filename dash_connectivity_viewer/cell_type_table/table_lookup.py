@@ -1,11 +1,87 @@
+import re
 import pandas as pd
 import numpy as np
-from ..common.lookup_utilities import get_root_id_from_nuc_id
+from ..common.lookup_utilities import (
+    get_root_id_from_nuc_id,
+    pooled_client,
+    table_metadata,
+)
 from ..common.link_utilities import voxel_resolution_from_info
-from caveclient import CAVEclient
+from ..common.cache_utilities import auth_scope, shared_cache
+from ..common.version_utilities import VERSION_WATCHER
+from ..common.dataframe_utilities import (
+    bridge_filter_column,
+    bridge_source_columns,
+    split_position_source_columns,
+)
 from dfbridge import DataframeBridge
 from copy import copy
 
+QUERY_CACHE = shared_cache("table_query", maxsize=32)
+VERSION_WATCHER.register_cache(QUERY_CACHE, lambda k: (k[0], k[1], k[2]))
+
+# Operators in DataTable filter syntax that are exact, case-sensitive equality
+_EQUALITY_OPERATORS = ["=", "eq", "s=", "seq"]
+_FILTER_TERM = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s+(?P<value>.+)$"
+)
+
+
+def _parse_filter_value(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+        return value[1:-1]
+    return value
+
+
+def parse_filter_query(filter_query):
+    """Split a DataTable filter_query string into (column, operator, value) terms.
+    Returns an empty list if the query is not a simple conjunction of terms."""
+    if filter_query is None or len(filter_query.strip()) == 0:
+        return []
+    if "||" in filter_query:
+        return []
+    terms = []
+    for expr in filter_query.split("&&"):
+        expr = expr.strip()
+        while expr.startswith("(") and expr.endswith(")"):
+            expr = expr[1:-1].strip()
+        m = _FILTER_TERM.match(expr)
+        if m is None:
+            return []
+        terms.append(
+            (
+                m.group("column"),
+                m.group("operator"),
+                _parse_filter_value(m.group("value")),
+            )
+        )
+    return terms
+
+
+def pushdown_filters(filter_query, pushdown_columns, root_id_columns=None):
+    """Translate the equality terms of a DataTable filter_query into a filter_equal_dict.
+
+    Only equality terms on pushdown_columns are translated; all other terms are left to
+    the DataTable's native filtering, which is unchanged by prefiltering the rows.
+    """
+    if root_id_columns is None:
+        root_id_columns = []
+    filter_equal_dict = {}
+    for column, operator, value in parse_filter_query(filter_query):
+        if (
+            column not in pushdown_columns
+            or operator.lower() not in _EQUALITY_OPERATORS
+        ):
+            continue
+        if column in root_id_columns:
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+        filter_equal_dict[column] = value
+    return filter_equal_dict
+
 
 class TableViewer(object):
     def __init__(
@@ -17,16 +93,12 @@ class TableViewer(object):
         id_query=None,
         id_query_type=None,
         column_query={},
+        filter_equal_query=None,
+        use_cache=True,
     ):
 
-        self._client = CAVEclient(
-            datastack_name=client.datastack_name,
-            server_address=client.server_address,
-            auth_token=client.auth.token,
-        )
-        self._table_schema = self._client.materialize.get_table_metadata(table_name)[
-            "schema_type"
-        ]
+        self._client = pooled_client(client)
+        self._table_schema = table_metadata(self._client, table_name)["schema_type"]
         self.config = config
         self._cell_type_bridge_schema = config.allowed_cell_type_schema_bridge.get(
             self._table_schema
@@ -34,6 +106,8 @@ class TableViewer(object):
 
         if config.soma_table is None:
             soma_table = client.info.get_datastack_info().get("soma_table")
+        else:
+            soma_table = config.soma_table
 
         self._soma_table = soma_table
         self._table_name = table_name
@@ -42,6 +116,10 @@ class TableViewer(object):
         self._data_resolution = None
 
         self._column_query = column_query
+        if filter_equal_query is None:
+            filter_equal_query = {}
+        self._filter_equal_query = filter_equal_query
+        self._use_cache = use_cache
         self._annotation_query = None
         self._id_query = id_query
         self._id_query_type = id_query_type
@@ -84,6 +162,40 @@ class TableViewer(object):
     def cell_type_bridge(self):
         return DataframeBridge(self._cell_type_bridge_schema)
 
+    def _select_columns(self):
+        """Source table columns needed to build the cell type table columns"""
+        if self._cell_type_bridge_schema is None:
+            columns = self.config.ct_table_columns
+        else:
+            columns = list(self._cell_type_bridge_schema.keys())
+        return split_position_source_columns(
+            bridge_source_columns(self._cell_type_bridge_schema, columns)
+        )
+
+    def _bridged_filters(self, filter_dict):
+        """Map filters on reformatted column names back to the columns of the source table.
+        Filters on columns that are not plain renames are dropped and left to the
+        DataTable's native filtering."""
+        source_filters = {}
+        for k, v in filter_dict.items():
+            source_column = bridge_filter_column(self._cell_type_bridge_schema, k)
+            if source_column is not None:
+                source_filters[source_column] = v
+        return source_filters
+
+    def _query_key(self, filter_in_dict, filter_equal_dict):
+        if self.live_query or not self._use_cache:
+            return None
+        return (
+            self.client.server_address,
+            self.client.datastack_name,
+            self.client.materialize.version,
+            self.table_name,
+            tuple(sorted((k, str(v)) for k, v in filter_in_dict.items())),
+            tuple(sorted((k, str(v)) for k, v in filter_equal_dict.items())),
+            auth_scope(self.client),
+        )
+
     def _populate_data(self):
         filter_in_dict = {}
         if self._id_query is not None:
@@ -91,13 +203,21 @@ class TableViewer(object):
         if self._annotation_query is not None:
             filter_in_dict.update({"id": self._annotation_query})
         filter_in_dict.update(self._column_query)
-
-        df = self.client.materialize.query_table(
-            self.table_name,
-            filter_in_dict=filter_in_dict,
-            timestamp=self.timestamp,
-            split_positions=True,
-        )
+        filter_equal_dict = self._bridged_filters(self._filter_equal_query)
+
+        query_key = self._query_key(filter_in_dict, filter_equal_dict)
+        df = QUERY_CACHE.get(query_key) if query_key is not None else None
+        if df is None:
+            df = self.client.materialize.query_table(
+                self.table_name,
+                filter_in_dict=filter_in_dict,
+                filter_equal_dict=filter_equal_dict if filter_equal_dict else None,
+                select_columns=self._select_columns(),
+                timestamp=self.timestamp,
+                split_positions=True,
+            )
+            if query_key is not None:
+                QUERY_CACHE.set(query_key, df)
 
         self._data = self.cell_type_bridge.reformat(df).fillna(np.nan)
 
@@ -118,6 +238,7 @@ class TableViewer(object):
         df = self.client.materialize.query_table(
             self.soma_table,
             filter_in_dict={self.config.nucleus_id_column: soma_ids},
+            select_columns=self.config.nucleus_lookup_columns,
             timestamp=self.timestamp,
         )
         if self.config.soma_table_query is not None:
@@ -0,0 +1,116 @@
+import flask
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+from . import cell_type_connectivity, cell_type_table, connectivity_table
+from .common.config import CommonConfig
+from .common.metrics_utilities import METRICS
+
+# App key to (create_app function, default url prefix, title on the index page)
+APPS = {
+    "connectivity_table": (
+        connectivity_table.create_app,
+        "/connectivity",
+        "Connectivity Table",
+    ),
+    "cell_type_connectivity": (
+        cell_type_connectivity.create_app,
+        "/cell-type-connectivity",
+        "Cell Type Connectivity",
+    ),
+    "cell_type_table": (
+        cell_type_table.create_app,
+        "/cell-type-table",
+        "Cell Type Table",
+    ),
+}
+
+
+def _index_page(links):
+    items = "".join(
+        f'<li><a href="{prefix}/">{title}</a></li>' for prefix, title in links
+    )
+    return (
+        "<html><head><title>Connectivity Viewers</title></head>"
+        f"<body><ul>{items}</ul></body></html>"
+    )
+
+
+def create_combined_app(configs, prefixes={}, **kwargs):
+    """Mount several viewer apps under one WSGI server.
+
+    All apps run in the same process and so share the CAVEclient pool, the table
+    metadata cache and the data caches (e.g. the synapses of a neuron viewed in both
+    connectivity apps are only queried once per materialization version).
+
+    Parameters
+    ----------
+    configs : dict
+        App key (see APPS) to config dict. Only apps with a config are mounted.
+    prefixes : dict, optional
+        App key to url prefix, e.g. {"connectivity_table": "/conn"}. Defaults to the
+        prefixes in APPS.
+    **kwargs
+        Passed to each create_app.
+
+    Returns
+    -------
+    flask.Flask
+        Server with an index page at "/" and each app at its prefix. Run it with any
+        WSGI server, e.g. `gunicorn "run_all:server"`. The mounted apps are in
+        server.extensions["dcv_apps"], as app key to (prefix, dash.Dash).
+    """
+    server = flask.Flask(__name__)
+    apps = {}
+    mounts = {}
+    links = []
+    metrics_endpoint = False
+    for app_key, config in configs.items():
+        if app_key not in APPS:
+            raise ValueError(f"App must be one of {list(APPS)}, not {app_key}")
+        create_app, default_prefix, title = APPS[app_key]
+        prefix = prefixes.get(app_key, default_prefix).rstrip("/")
+        app = create_app(
+            config=config,
+            requests_pathname_prefix=f"{prefix}/",
+            routes_pathname_prefix="/",
+            **kwargs,
+        )
+        apps[app_key] = (prefix, app)
+        mounts[prefix] = app.server
+        links.append((prefix, title))
+        metrics_endpoint = metrics_endpoint or CommonConfig(config).metrics_endpoint
+
+    server.extensions["dcv_apps"] = apps
+    server.add_url_rule("/", "index", lambda: _index_page(links))
+    if metrics_endpoint:
+        # Metrics are process-wide, so every app's /metrics reports the same values
+        server.add_url_rule(
+            "/metrics",
+            "dcv_metrics",
+            lambda: flask.Response(
+                METRICS.render(), mimetype="text/plain; version=0.0.4"
+            ),
+        )
+    server.wsgi_app = DispatcherMiddleware(server.wsgi_app, mounts)
+    return server
+
+
+def warmup(server, **kwargs):
+    """Warm up every app mounted in a combined server, e.g. from a gunicorn post_fork hook.
+
+    Parameters
+    ----------
+    server : flask.Flask
+        Server from create_combined_app.
+    **kwargs
+        Passed to each app's warmup, e.g. datastacks.
+
+    Returns
+    -------
+    dict
+        App key to the report from its warmup.
+    """
+    return {
+        app_key: app.warmup(**kwargs)
+        for app_key, (_, app) in server.extensions["dcv_apps"].items()
+    }
@@ -0,0 +1,141 @@
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from .metrics_utilities import BYTE_BUCKETS, METRICS
+
+ADMISSIONS = METRICS.counter(
+    "dcv_admissions_total", "Neuron lookups by admission control outcome"
+)
+ESTIMATED_BYTES = METRICS.histogram(
+    "dcv_request_estimated_bytes",
+    "Estimated memory of admitted neuron lookups",
+    buckets=BYTE_BUCKETS,
+)
+PEAK_BYTES = METRICS.histogram(
+    "dcv_request_peak_bytes",
+    "Peak traced memory while building neuron lookup results",
+    buckets=BYTE_BUCKETS,
+)
+
+
+class AdmissionError(Exception):
+    """Raised when a request would not fit in the memory budget"""
+
+
+class MemoryBudget(object):
+    """Process-wide budget of memory reserved by running requests"""
+
+    def __init__(self):
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, n_bytes, budget, timeout, lower_bound=False):
+        """Hold n_bytes of the budget for the duration of the block, waiting up to
+        timeout seconds for other requests to release enough of it. If lower_bound is
+        True, n_bytes is only known to be at least this large.
+
+        Raises
+        ------
+        AdmissionError
+            If n_bytes is larger than the whole budget, or not enough of the budget
+            was freed within the timeout.
+        """
+        if n_bytes > budget:
+            ADMISSIONS.inc(outcome="rejected")
+            raise AdmissionError(
+                f"This lookup needs an estimated {'at least ' if lower_bound else ''}"
+                f"{_format_bytes(n_bytes)} of memory, "
+                f"more than the {_format_bytes(budget)} this server allows per worker. "
+                "Try a neuron with fewer synapses, or fewer root ids at once."
+            )
+        with self._cond:
+            queued = self.in_use + n_bytes > budget
+            admitted = self._cond.wait_for(
+                lambda: self.in_use + n_bytes <= budget, timeout=timeout
+            )
+            if not admitted:
+                ADMISSIONS.inc(outcome="timeout")
+                raise AdmissionError(
+                    "The server is busy with other large lookups. "
+                    "Please try again in a minute."
+                )
+            self.in_use += n_bytes
+        ADMISSIONS.inc(outcome="queued" if queued else "admitted")
+        ESTIMATED_BYTES.observe(n_bytes)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= n_bytes
+                self._cond.notify_all()
+
+
+MEMORY_BUDGET = MemoryBudget()
+
+
+def _format_bytes(n_bytes):
+    if n_bytes >= 1e9:
+        return f"{n_bytes / 1e9:.1f} GB"
+    return f"{n_bytes / 1e6:.0f} MB"
+
+
+@contextmanager
+def trace_peak_memory():
+    """Record the peak traced memory of a block in PEAK_BYTES.
+
+    Tracing is process-wide and stays on once started, so with concurrent requests
+    the peak includes their allocations too. Tracing slows allocation-heavy code,
+    so it is only used when config.memory_tracing is True.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        PEAK_BYTES.observe(max(peak - start, 0))
+
+
+def estimate_memory(n_synapses, config):
+    """Estimated peak memory in bytes of building partner tables from n_synapses synapses"""
+    return int(n_synapses * config.memory_per_synapse)
+
+
+@contextmanager
+def admit(nrn_data, config):
+    """Admission control for building the results of a neuron lookup.
+
+    The number of synapses is counted with a query of synapse ids only, limited to just
+    over what fits in the budget, and the memory estimated from it is reserved from
+    config.memory_budget while the block runs. Does nothing unless a budget is set.
+
+    Parameters
+    ----------
+    nrn_data : NeuronData
+        Data object for the lookup, before its synapses are loaded.
+    config : CommonConfig
+        App config.
+
+    Raises
+    ------
+    AdmissionError
+        With a message for the user if the lookup does not fit in the budget.
+    """
+    with trace_peak_memory() if config.memory_tracing else nullcontext():
+        if config.memory_budget is None:
+            yield
+            return
+        limit = int(config.memory_budget / config.memory_per_synapse) + 1
+        counts = nrn_data.synapse_count(limit=limit)
+        n_bytes = estimate_memory(sum(counts), config)
+        with MEMORY_BUDGET.reserve(
+            n_bytes,
+            config.memory_budget,
+            config.admission_timeout,
+            lower_bound=max(counts) >= limit,
+        ):
+            yield
@@ -0,0 +1,166 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import orjson
+
+from .timing_utilities import span
+from .metrics_utilities import METRICS, STATE_UPLOADS
+
+
+class LRUCache(object):
+    """Thread-safe least-recently-used cache with a fixed number of entries.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries to keep, by default 256. If None, the cache is unbounded.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def set_unless(self, key, value, keep):
+        """Set key to value in one step, unless keep(current value) is True for a
+        value already in the cache. Returns True if the value was set."""
+        with self._lock:
+            if key in self._data and keep(self._data[key]):
+                return False
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def evict(self, predicate):
+        """Remove every entry whose key satisfies predicate. Returns the number removed."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+# Caches shared by every app in the process, by name
+SHARED_CACHES = {}
+_SHARED_CACHES_LOCK = threading.Lock()
+
+
+def shared_cache(name, maxsize=256):
+    """Process-wide LRUCache, created on first use and reported in the metrics.
+
+    Apps mounted in the same process (see dash_connectivity_viewer.combined_app) get
+    the same cache for the same name, so results can be reused across apps.
+    """
+    with _SHARED_CACHES_LOCK:
+        if name not in SHARED_CACHES:
+            SHARED_CACHES[name] = LRUCache(maxsize=maxsize)
+            METRICS.register_cache(name, SHARED_CACHES[name])
+        return SHARED_CACHES[name]
+
+
+def auth_scope(client):
+    """Auth token of a client, added to the keys of shared caches of query results.
+
+    Results depend on the permissions of the token they were queried with, so users
+    only share cache entries when they use the same token.
+    """
+    return client.auth.token
+
+
+def clear_shared_caches():
+    """Empty every shared cache"""
+    with _SHARED_CACHES_LOCK:
+        caches = list(SHARED_CACHES.values())
+    for cache in caches:
+        cache.clear()
+
+
+def _json_default(obj):
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def state_hash(state):
+    """Content hash of a json-serializable neuroglancer state"""
+    with span("state_serialize"):
+        state_bytes = orjson.dumps(
+            state,
+            default=_json_default,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+        return hashlib.sha256(state_bytes).hexdigest()
+
+
+STATE_ID_CACHE = shared_cache("state_id", maxsize=1024)
+
+
+def upload_state_cached(state, state_service, cache=None):
+    """Upload a state to the state server, reusing the id of an identical previous upload.
+
+    Parameters
+    ----------
+    state : dict
+        Neuroglancer state as a json-serializable dict.
+    state_service : object
+        State service with an `upload_state_json` method, typically `client.state`.
+    cache : LRUCache, optional
+        Cache mapping state hashes to state ids. If None, the module-level cache is used.
+
+    Returns
+    -------
+    int
+        State id on the state server.
+    """
+    if cache is None:
+        cache = STATE_ID_CACHE
+    key = (getattr(state_service, "server_address", None), state_hash(state))
+    state_id = cache.get(key)
+    if state_id is None:
+        state_id = state_service.upload_state_json(state)
+        STATE_UPLOADS.inc()
+        cache.set(key, state_id)
+    return state_id
@@ -24,6 +24,30 @@ class CommonConfig(object):
             raise ValueError("Must set server address parameter!")
 
         self.disallow_live_query = config.get("disallow_live_query", False)
+        self.live_incremental_refresh = config.get("live_incremental_refresh", True)
+        self.live_refresh_max_age = config.get("live_refresh_max_age", 600)
+
+        # Seconds between checks for a new materialization version, None to turn off
+        self.version_poll_interval = config.get("version_poll_interval", 300)
+
+        # Speculative background fetches of top partners after each lookup
+        self.prefetch_top_partners = config.get("prefetch_top_partners", 0)
+        self.prefetch_max_concurrent = config.get("prefetch_max_concurrent", 1)
+        self.prefetch_max_pending = config.get("prefetch_max_pending", 10)
+        self.prefetch_max_per_minute = config.get("prefetch_max_per_minute", 30)
+
+        # Admission control of neuron lookups, with budget in bytes per worker
+        self.memory_budget = config.get("memory_budget", None)
+        self.memory_per_synapse = config.get("memory_per_synapse", 1_000)
+        self.admission_timeout = config.get("admission_timeout", 30)
+        self.memory_tracing = config.get("memory_tracing", False)
+
+        # Per-request stage timing, logged with loguru
+        self.request_timing = config.get("request_timing", False)
+        self.server_timing_header = config.get("server_timing_header", False)
+
+        # Prometheus text metrics served at /metrics
+        self.metrics_endpoint = config.get("metrics_endpoint", False)
         self.image_black = config.get("image_black", 0)
         self.image_white = config.get("image_white", 1)
 
@@ -40,6 +64,7 @@ class CommonConfig(object):
         self.max_server_dataframe_length = config.get(
             "max_server_dataframe_length", 20_000
         )
+        self.max_server_synapse_count = config.get("max_server_synapse_count", 100_000)
 
         # If None, the info service is used
         self.nucleus_table = config.get("nucleus_table", None)
@@ -55,6 +80,8 @@ class CommonConfig(object):
         self.syn_id_col = "id"
         self.pre_pt_root_id = "pre_pt_root_id"
         self.post_pt_root_id = "post_pt_root_id"
+        self.pre_pt_supervoxel_id = "pre_pt_supervoxel_id"
+        self.post_pt_supervoxel_id = "post_pt_supervoxel_id"
         self.synapse_aggregation_rules = config.get("synapse_aggregation_rules", {})
 
         self.syn_pt_prefix = config.get("syn_position_column", "ctr_pt")
@@ -76,6 +103,7 @@ class CommonConfig(object):
         self.num_soma_prefix = "num"
         self.num_syn_col = "num_syn"
         self.root_id_col = "root_id"
+        self.query_root_id_col = "query_root_id"
 
         self.num_soma_suffix = "_soma"
         self.num_soma_col = f"{self.num_soma_prefix}{self.num_soma_suffix}"
@@ -109,4 +137,14 @@ class CommonConfig(object):
             self.soma_pt_root_id,
             self.soma_pt_position,
             self.num_soma_col,
-        ]
\ No newline at end of file
+        ]
+
+        # Columns requested from the server for nucleus/soma lookups
+        self.nucleus_lookup_columns = [self.nucleus_id_column, self.soma_pt_root_id]
+        if self.soma_table_query is not None:
+            self.nucleus_lookup_columns.append(self.soma_ct_col)
+        self.soma_table_select_columns = self.nucleus_lookup_columns + [
+            c
+            for c in self.soma_table_columns
+            if c != self.num_soma_col and c not in self.nucleus_lookup_columns
+        ]
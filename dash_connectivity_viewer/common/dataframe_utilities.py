@@ -1,8 +1,18 @@
 from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import re
+import time
 import numpy as np
 
+from .cache_utilities import auth_scope, shared_cache
+from .timing_utilities import timed
+from .metrics_utilities import PROPERTY_QUERY_LATENCY
+from .version_utilities import VERSION_WATCHER
+
+# Synapse data of recently viewed neurons at a fixed materialization version
+SYNAPSE_CACHE = shared_cache("synapse_data", maxsize=16)
+VERSION_WATCHER.register_cache(SYNAPSE_CACHE, lambda k: (k[0], k[1], k[4]))
+
 
 def assemble_pt_position(row, prefix=""):
     return np.array(
@@ -14,10 +24,83 @@ def assemble_pt_position(row, prefix=""):
     )
 
 
-def get_specific_soma(soma_table, root_id, client, timestamp):
+def stack_pt_position(df, prefix=""):
+    """Vectorized equivalent of assemble_pt_position over a whole dataframe, returning an Nx3 array"""
+    return np.stack(
+        [
+            df[f"{prefix}pt_position_x"].values,
+            df[f"{prefix}pt_position_y"].values,
+            df[f"{prefix}pt_position_z"].values,
+        ],
+        axis=1,
+    )
+
+
+def assign_pt_position(df, position_column, prefix=""):
+    """Set a column of per-row position arrays from split x/y/z position columns"""
+    if len(df) > 0:
+        df[position_column] = list(stack_pt_position(df, prefix=prefix))
+    else:
+        df[position_column] = []
+    return df
+
+
+def _unique_columns(columns):
+    return list(dict.fromkeys(columns))
+
+
+def bridge_source_columns(bridge_schema, columns):
+    """Columns of the source table needed to build `columns` through a dfbridge schema.
+    Returns None if they cannot be determined, e.g. for function-based schema entries.
+    """
+    if bridge_schema is None:
+        return _unique_columns(columns)
+    source_columns = []
+    for col in columns:
+        if col not in bridge_schema:
+            source_columns.append(col)
+            continue
+        v = bridge_schema[col]
+        if v is None:
+            continue
+        elif isinstance(v, str):
+            source_columns.append(v)
+        elif isinstance(v, dict) and "from" in v:
+            source_columns.append(v["from"])
+        else:
+            return None
+    return _unique_columns(source_columns)
+
+
+def bridge_filter_column(bridge_schema, column):
+    """Source table column whose values equal those of `column` after a dfbridge reformat.
+    Returns None unless the column is unchanged (no schema) or a plain rename, since
+    filters on other columns cannot be applied to the source table."""
+    if bridge_schema is None:
+        return column
+    v = bridge_schema.get(column)
+    if isinstance(v, str):
+        return v
+    elif isinstance(v, dict) and set(v.keys()) <= {"type", "from", "fill_missing"}:
+        if v.get("type") == "rename" and "from" in v:
+            return v["from"]
+    return None
+
+
+def split_position_source_columns(columns):
+    """Map split position columns (e.g. pt_position_x) back to the bound point column"""
+    if columns is None:
+        return None
+    return _unique_columns(
+        [re.sub("_position_[xyz]$", "_position", c) for c in columns]
+    )
+
+
+def get_specific_soma(soma_table, root_id, client, timestamp, select_columns=None):
     soma_df = client.materialize.query_table(
         soma_table,
         filter_equal_dict={"pt_root_id": root_id},
+        select_columns=select_columns,
         timestamp=timestamp,
     )
     return soma_df
@@ -33,9 +116,14 @@ def _synapse_df(
     synapse_table_columns,
     exclude_autapses=True,
 ):
+    if np.ndim(root_id) == 0:
+        root_filter = dict(filter_equal_dict={f"{direction}_pt_root_id": root_id})
+    else:
+        root_filter = dict(filter_in_dict={f"{direction}_pt_root_id": list(root_id)})
     syn_df = client.materialize.query_table(
         synapse_table,
-        filter_equal_dict={f"{direction}_pt_root_id": root_id},
+        **root_filter,
+        select_columns=synapse_table_columns,
         split_positions=True,
         timestamp=timestamp,
     )
@@ -43,13 +131,7 @@ def _synapse_df(
     grp = re.search("^(.*)pt_position", synapse_position_column)
     prefix = grp.groups()[0]
 
-    if len(syn_df) > 0:
-        syn_df[synapse_position_column] = syn_df.apply(
-            lambda x: assemble_pt_position(x, prefix=prefix),
-            axis=1,
-        ).values
-    else:
-        syn_df[synapse_position_column] = []
+    syn_df = assign_pt_position(syn_df, synapse_position_column, prefix=prefix)
 
     if exclude_autapses:
         syn_df = syn_df.query("pre_pt_root_id != post_pt_root_id").reset_index(
@@ -58,6 +140,25 @@ def _synapse_df(
     return syn_df[synapse_table_columns]
 
 
+def synapse_count(
+    direction, synapse_table, root_id, client, timestamp, config, limit=None
+):
+    """Number of synapses on one side of a root id (or list of root ids), from a query
+    of synapse ids only. Stops counting at limit, if set."""
+    if np.ndim(root_id) == 0:
+        root_filter = dict(filter_equal_dict={f"{direction}_pt_root_id": root_id})
+    else:
+        root_filter = dict(filter_in_dict={f"{direction}_pt_root_id": list(root_id)})
+    df = client.materialize.query_table(
+        synapse_table,
+        **root_filter,
+        select_columns=[config.syn_id_col],
+        limit=limit,
+        timestamp=timestamp,
+    )
+    return len(df)
+
+
 def pre_synapse_df(
     synapse_table,
     root_id,
@@ -88,6 +189,7 @@ def post_synapse_df(synapse_table, root_id, client, timestamp, config):
     )
 
 
+@timed("synapse_data")
 def synapse_data(
     synapse_table,
     root_id,
@@ -118,6 +220,207 @@ def synapse_data(
     return pre.result(), post.result()
 
 
+def read_only(df):
+    """Mark the column arrays of df read-only, so that writing into them raises instead
+    of changing data shared with a cache or other dataframes. Columns can still be added
+    to or replaced in a shallow copy, and copies of the values are writeable again.
+    """
+    for col in df.columns:
+        arr = df[col].values
+        while isinstance(arr, np.ndarray) and arr.flags.writeable:
+            arr.flags.writeable = False
+            arr = arr.base
+    return df
+
+
+def synapse_cache_key(synapse_table, root_id, client, config):
+    """Key of the synapse data of a neuron in SYNAPSE_CACHE"""
+    return (
+        client.server_address,
+        client.datastack_name,
+        synapse_table,
+        int(root_id),
+        client.materialize.version,
+        config.syn_pt_position,
+        tuple(config.synapse_table_columns_dataframe),
+        auth_scope(client),
+    )
+
+
+def cached_synapse_data(
+    synapse_table,
+    root_id,
+    client,
+    config,
+    n_threads=2,
+    cache=None,
+):
+    """Synapse data at the materialization version of the client, reusing the result
+    of an earlier query for the same neuron and columns, e.g. from another app.
+
+    Parameters
+    ----------
+    synapse_table : str
+        Synapse table name.
+    root_id : int
+        Root id to query.
+    client : CAVEclient
+        Client for the datastack.
+    config : CommonConfig
+        App config.
+    n_threads : int, optional
+        Number of threads, by default 2.
+    cache : LRUCache, optional
+        Cache of previous queries, by default SYNAPSE_CACHE.
+
+    Returns
+    -------
+    pd.DataFrame
+        Output synapses. Columns can be added without changing the cached dataframe.
+    pd.DataFrame
+        Input synapses.
+    """
+    if cache is None:
+        cache = SYNAPSE_CACHE
+    key = synapse_cache_key(synapse_table, root_id, client, config)
+    result = cache.get(key)
+    if result is None:
+        result = synapse_data(synapse_table, root_id, client, None, config, n_threads)
+        cache.set(key, result)
+    return tuple(df.copy(deep=False) for df in result)
+
+
+@timed("synapse_data")
+def batch_synapse_data(
+    synapse_table,
+    root_ids,
+    client,
+    timestamp,
+    config,
+    n_threads=1,
+):
+    """Query input and output synapses for many root ids in chunks of
+    config.target_root_id_per_call, running chunks in parallel."""
+    root_ids = np.unique(np.asarray(root_ids, dtype=np.int64))
+    n_chunks = max(int(np.ceil(len(root_ids) / config.target_root_id_per_call)), 1)
+    chunks = np.array_split(root_ids, n_chunks)
+
+    with ThreadPoolExecutor(max(n_threads, 1)) as exe:
+        pre_jobs = [
+            exe.submit(
+                pre_synapse_df,
+                synapse_table,
+                chunk,
+                client,
+                timestamp,
+                config,
+            )
+            for chunk in chunks
+        ]
+        post_jobs = [
+            exe.submit(
+                post_synapse_df,
+                synapse_table,
+                chunk,
+                client,
+                timestamp,
+                config,
+            )
+            for chunk in chunks
+        ]
+    pre_dfs = [job.result() for job in pre_jobs]
+    post_dfs = [job.result() for job in post_jobs]
+    pre_df = pd.concat(pre_dfs, ignore_index=True)
+    post_df = pd.concat(post_dfs, ignore_index=True)
+    pre_df.attrs = pre_dfs[0].attrs
+    post_df.attrs = post_dfs[0].attrs
+    return pre_df, post_df
+
+
+def dataframe_seed(df, key_columns):
+    """Seed derived from the set of row keys, independent of row order"""
+    if len(df) == 0:
+        return 0
+    hashes = pd.util.hash_pandas_object(df[key_columns], index=False).values
+    return int(np.bitwise_xor.reduce(hashes))
+
+
+def stratified_downsample(df, max_length, strata_column=None, key_columns=None, seed=0):
+    """Deterministically downsample a dataframe while keeping every stratum.
+
+    Each stratum keeps a share of rows proportional to its size, but at least one row.
+    Rows are chosen by a seeded hash of their keys, so the same rows and seed always
+    give the same sample regardless of row order.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe to downsample.
+    max_length : int
+        Target number of rows. May be exceeded only if there are more strata than rows allowed.
+    strata_column : str, optional
+        Column defining strata (e.g. cell type). Null values form their own stratum.
+    key_columns : list, optional
+        Columns identifying rows. If None, the index is used.
+    seed : int, optional
+        Seed to mix into the row hashes, by default 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        Downsampled dataframe in the original row order.
+    """
+    n = len(df)
+    if n <= max_length:
+        return df
+
+    if key_columns is None:
+        row_hash = pd.util.hash_pandas_object(df.index, index=False).values
+    else:
+        row_hash = pd.util.hash_pandas_object(df[key_columns], index=False).values
+    rank = pd.util.hash_array(row_hash ^ np.uint64(seed % 2**64))
+
+    if strata_column is None:
+        codes = np.zeros(n, dtype=int)
+    else:
+        codes = pd.factorize(df[strata_column])[0] + 1
+
+    counts = np.bincount(codes)
+    quota = np.minimum(
+        counts, np.maximum(1, np.floor(counts * max_length / n)).astype(int)
+    )
+
+    order = np.lexsort((rank, codes))
+    sorted_codes = codes[order]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position_in_stratum = np.arange(n) - starts[sorted_codes]
+    keep = order[position_in_stratum < quota[sorted_codes]]
+    return df.iloc[np.sort(keep)]
+
+
+def downsample_points(df, point_column, max_points):
+    """Thin out per-row point lists so the total is at most max_points, keeping at least one
+    point for every row. Points are taken at evenly spaced positions so the result is deterministic.
+    """
+    if max_points is None or len(df) == 0:
+        return df
+    lengths = np.array([len(pts) for pts in df[point_column]])
+    total = lengths.sum()
+    if total <= max_points:
+        return df
+
+    quota = np.minimum(
+        lengths, np.maximum(1, np.floor(lengths * max_points / total)).astype(int)
+    )
+    thinned = []
+    for pts, n_pts, n_keep in zip(df[point_column], lengths, quota):
+        inds = np.unique(np.linspace(0, n_pts - 1, n_keep).astype(int))
+        thinned.append([pts[ii] for ii in inds])
+    df = df.copy()
+    df[point_column] = thinned
+    return df
+
+
 def stringify_root_ids(df, stringify_cols=None):
     if stringify_cols is None:
         stringify_cols = [col for col in df.columns if re.search("_root_id$", col)]
@@ -135,28 +438,61 @@ def _get_single_table(
     client,
     timestamp,
     table_filter=None,
+    select_columns=None,
 ):
     keep_columns = include_columns.copy()
+    t0 = time.perf_counter()
     df = client.materialize.query_table(
         table_name,
         filter_in_dict={root_id_column: root_ids},
+        select_columns=select_columns,
         timestamp=timestamp,
     )
+    PROPERTY_QUERY_LATENCY.observe(time.perf_counter() - t0, table=table_name)
     if table_filter is not None:
         df = df.query(table_filter).reset_index(drop=True)
 
-    for k, v in aggregate_map.items():
-        df[k] = df.groupby(v["group_by"])[v["column"]].transform(v["agg"])
-        keep_columns.append(k)
+    duplicated = df.duplicated(root_id_column, keep=False).values
     if len(aggregate_map) != 0:
-        df.loc[df.index[df.duplicated(root_id_column, False)], include_columns] = np.nan
-        df.drop_duplicates(root_id_column, keep="first", inplace=True)
+        # Aggregates are computed over all rows, then kept on the first row of each root
+        # id, whose other properties are ambiguous if it has several rows
+        first = ~df.duplicated(root_id_column, keep="first").values
+        out = df.loc[first].copy()
+        out.loc[duplicated[first], include_columns] = np.nan
+        for k, v in aggregate_map.items():
+            out[k] = _aggregate_column(df, out, v["group_by"], v["column"], v["agg"])
+            keep_columns.append(k)
     else:
-        df.drop_duplicates(root_id_column, keep=False, inplace=True)
-    df.set_index(root_id_column, inplace=True)
-    return df[keep_columns]
+        out = df.loc[~duplicated]
+    return out.set_index(root_id_column)[keep_columns]
+
+
+def _aggregate_column(df, out, group_by, column, agg):
+    """Aggregate of column over the rows of df in each group, for the rows of out"""
+    if agg == "count":
+        counts = df[group_by].values[df[column].notna().values]
+        aggregate = pd.Series(counts).value_counts()
+    else:
+        aggregate = df.groupby(group_by)[column].agg(agg)
+    values = out[group_by].map(aggregate)
+    if agg == "count" and out[group_by].notna().all():
+        # Groups without any non-null values count zero
+        values = values.fillna(0).astype(np.int64)
+    return values
+
+
+def property_select_columns(attrs):
+    """Columns to request from the server for a property table entry"""
+    if "select_columns" in attrs:
+        return attrs.get("select_columns")
+    columns = [attrs.get("root_id")] + attrs.get("include", [])
+    for v in attrs.get("aggregate", {}).values():
+        columns += [v["group_by"], v["column"]]
+    columns += attrs.get("filter_columns", [])
+    return bridge_source_columns(attrs.get("table_bridge_schema"), columns)
 
 
+@timed("property_table_data")
 def property_table_data(
     root_ids,
     property_mapping,
@@ -181,6 +517,7 @@ def property_table_data(
                     client,
                     timestamp,
                     attrs.get("table_filter", None),
+                    property_select_columns(attrs),
                 )
             )
     return {tname: job.result() for tname, job in zip(property_mapping, jobs)}
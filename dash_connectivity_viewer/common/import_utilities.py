@@ -0,0 +1,49 @@
+import importlib
+import threading
+
+
+class LazyModule(object):
+    """Module proxy that imports the module on first attribute access.
+
+    Used for heavy dependencies that are only needed once a user asks for a link or a
+    plot, so that importing an app (and starting a worker) does not pay for them.
+
+    Parameters
+    ----------
+    name : str
+        Full module name, e.g. "nglui.statebuilder".
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found on the proxy itself
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_module(name):
+    """Proxy for a module that is imported when first used"""
+    return LazyModule(name)
+
+
+def preload(*modules):
+    """Import lazily loaded modules now, e.g. while warming up a worker"""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
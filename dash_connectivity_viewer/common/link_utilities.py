@@ -1,15 +1,28 @@
 from logging import info
-from nglui import statebuilder
 import pandas as pd
 import numpy as np
-from seaborn import color_palette
+from functools import lru_cache
 from itertools import cycle
+from .import_utilities import lazy_module
 from .lookup_utilities import make_client
+from .cache_utilities import upload_state_cached
+from .dataframe_utilities import downsample_points
+from .timing_utilities import span
 
 EMPTY_INFO_CACHE = {"aligned_volume": {}, "cell_type_column": None}
 MAX_URL_LENGTH = 1_750_000
 DEFAULT_NGL = "https://neuromancer-seung-import.appspot.com/"
 
+# Only needed to build links, so imported on first use
+statebuilder = lazy_module("nglui.statebuilder")
+seaborn = lazy_module("seaborn")
+
+
+@lru_cache(maxsize=None)
+def palette_hex(name):
+    """Hex colors of a seaborn palette, built once per process"""
+    return tuple(seaborn.color_palette(name).as_hex())
+
 
 def image_source(info_cache):
     return info_cache["aligned_volume"].get("image_source", "")
@@ -31,6 +44,11 @@ def root_id(info_cache):
     return int(info_cache.get("root_id", None))
 
 
+def root_ids(info_cache):
+    """Root ids of the queried neurons, stored comma-separated for multi-neuron queries"""
+    return [int(x) for x in str(info_cache.get("root_id", "")).split(",") if x]
+
+
 def timestamp(info_cache):
     return info_cache.get("ngl_timestamp", None)
 
@@ -126,8 +144,8 @@ def generate_statebuilder_pre(
     )
     seg = statebuilder.SegmentationLayerConfig(
         seg_source(info_cache),
-        fixed_ids=[root_id(info_cache)],
-        fixed_id_colors=["#ffffff"],
+        fixed_ids=root_ids(info_cache),
+        fixed_id_colors=["#ffffff"] * len(root_ids(info_cache)),
         alpha_3d=0.8,
         timestamp=timestamp(info_cache),
     )
@@ -160,8 +178,8 @@ def generate_statebuilder_post(info_cache, config, data_resolution=None):
 
     seg = statebuilder.SegmentationLayerConfig(
         seg_source(info_cache),
-        fixed_ids=[root_id(info_cache)],
-        fixed_id_colors=["#ffffff"],
+        fixed_ids=root_ids(info_cache),
+        fixed_id_colors=["#ffffff"] * len(root_ids(info_cache)),
         alpha_3d=0.8,
         timestamp=timestamp(info_cache),
     )
@@ -215,8 +233,8 @@ def generate_statebuider_syn_grouped(
 
     seg = statebuilder.SegmentationLayerConfig(
         seg_source(info_cache),
-        fixed_ids=[root_id(info_cache)],
-        fixed_id_colors=[fixed_id_color],
+        fixed_ids=root_ids(info_cache),
+        fixed_id_colors=[fixed_id_color] * len(root_ids(info_cache)),
         selected_ids_column=selected_ids_column,
         alpha_3d=0.8,
         timestamp=timestamp(info_cache),
@@ -273,7 +291,7 @@ def generate_url_cell_types(
         )
     ]
     dfs = [None]
-    colors = color_palette("tab20").as_hex()
+    colors = palette_hex("tab20")
     for ct, clr in zip(cell_types, cycle(colors)):
         anno = statebuilder.AnnotationLayerConfig(
             ct,
@@ -295,7 +313,8 @@ def generate_url_cell_types(
         )
         dfs.append(df.query("cell_type == @ct"))
     csb = statebuilder.ChainedStateBuilder(sbs)
-    return csb.render_state(dfs, return_as=return_as)
+    with span("statebuilder_render"):
+        return csb.render_state(dfs, return_as=return_as)
 
 
 def generate_statebuilder_syn_cell_types(
@@ -321,7 +340,7 @@ def generate_statebuilder_syn_cell_types(
     seg = statebuilder.SegmentationLayerConfig(
         seg_source(info_cache),
         alpha_3d=0.8,
-        fixed_ids=[int(info_cache["root_id"])],
+        fixed_ids=root_ids(info_cache),
         timestamp=timestamp(info_cache),
     )
     sbs = [
@@ -331,7 +350,7 @@ def generate_statebuilder_syn_cell_types(
         )
     ]
     dfs = [None]
-    colors = color_palette("tab20").as_hex()
+    colors = palette_hex("tab20")
     for ct, clr in zip(cell_types, cycle(colors)):
         anno = statebuilder.AnnotationLayerConfig(
             ct,
@@ -356,15 +375,55 @@ def generate_statebuilder_syn_cell_types(
     return csb, dfs
 
 
+def state_server_url(state, client):
+    """Upload a state to the state server and return a neuroglancer link to it.
+    Identical states reuse the id of a previous upload."""
+    with span("state_upload"):
+        state_id = upload_state_cached(state, client.state)
+    ngl_url = client.info.viewer_site()
+    if ngl_url is None:
+        ngl_url = DEFAULT_NGL
+    return client.state.build_neuroglancer_url(state_id, ngl_url=ngl_url)
+
+
+def _num_points(df, point_column):
+    if df is None:
+        return 0
+    return sum([len(pts) for pts in df[point_column]])
+
+
+def limit_synapse_points(df, config):
+    """Thin synapse points per partner so a state stays under the server synapse limit.
+    For a list of dataframes, as used by chained statebuilders, the limit is shared
+    in proportion to the number of points in each."""
+    if not isinstance(df, list):
+        return downsample_points(
+            df, config.syn_pt_position, config.max_server_synapse_count
+        )
+    n_points = [_num_points(d, config.syn_pt_position) for d in df]
+    total = max(sum(n_points), 1)
+    return [
+        (
+            None
+            if d is None
+            else downsample_points(
+                d,
+                config.syn_pt_position,
+                int(config.max_server_synapse_count * n / total),
+            )
+        )
+        for d, n in zip(df, n_points)
+    ]
+
+
 def make_url_robust(df, sb, datastack, config):
     """Generate a url from a neuroglancer state. If too long, return through state server"""
-    url = sb.render_state(df, return_as="url")
+    with span("statebuilder_render"):
+        url = sb.render_state(df, return_as="url")
     if len(url) > MAX_URL_LENGTH:
         client = make_client(datastack, config.server_address)
-        state = sb.render_state(df, return_as="dict")
-        state_id = client.state.upload_state_json(state)
-        ngl_url = client.info.viewer_site()
-        if ngl_url is None:
-            ngl_url = DEFAULT_NGL
-        url = client.state.build_neuroglancer_url(state_id, ngl_url=ngl_url)
+        df = limit_synapse_points(df, config)
+        with span("statebuilder_render"):
+            state = sb.render_state(df, return_as="dict")
+        url = state_server_url(state, client)
     return url
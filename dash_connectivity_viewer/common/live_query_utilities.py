@@ -0,0 +1,293 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache_utilities import auth_scope, shared_cache
+from .timing_utilities import timed
+from .dataframe_utilities import (
+    _synapse_df,
+    property_select_columns,
+    property_table_data,
+)
+
+# Last live refresh per (server, datastack, synapse table, root id)
+LIVE_QUERY_CACHE = shared_cache("live_query", maxsize=32)
+
+
+def _partner_columns(direction, config):
+    """Partner root id and supervoxel id columns for synapses queried on one side"""
+    if direction == "pre":
+        return config.post_pt_root_id, config.post_pt_supervoxel_id
+    else:
+        return config.pre_pt_root_id, config.pre_pt_supervoxel_id
+
+
+def _live_synapse_df(direction, synapse_table, root_id, client, timestamp, config):
+    _, sv_column = _partner_columns(direction, config)
+    return _synapse_df(
+        direction,
+        synapse_table,
+        root_id,
+        client,
+        timestamp,
+        config.syn_pt_position,
+        config.synapse_table_columns_dataframe + [sv_column],
+    )
+
+
+def _store_entry(cache, entry):
+    """Store a refresh as a new cache entry, unless a later refresh is already stored"""
+    cache.set_unless(
+        entry["key"], entry, lambda current: current["timestamp"] > entry["timestamp"]
+    )
+
+
+def _property_key(table_name, attrs):
+    return (
+        table_name,
+        tuple(property_select_columns(attrs)),
+        attrs.get("table_filter"),
+    )
+
+
+def reroot_partners(syn_df, direction, expired_roots, client, timestamp, config):
+    """Look up new partner root ids for synapses whose partner root id has expired.
+
+    Parameters
+    ----------
+    syn_df : pd.DataFrame
+        Synapse dataframe from a live query, including the partner supervoxel id column.
+    direction : str
+        "pre" if syn_df holds output synapses, "post" for input synapses.
+    expired_roots : array-like
+        Root ids that are no longer valid at timestamp.
+    client : CAVEclient
+        Client for the datastack.
+    timestamp : datetime.datetime
+        Time to look up new root ids at.
+    config : CommonConfig
+        App config.
+
+    Returns
+    -------
+    pd.DataFrame
+        Synapse dataframe with current partner root ids.
+    np.ndarray
+        Unique partner root ids that were not in the original dataframe.
+    """
+    root_column, sv_column = _partner_columns(direction, config)
+    stale = syn_df[root_column].isin(expired_roots).values
+    if not np.any(stale):
+        return syn_df, np.array([], dtype=np.int64)
+    new_roots = np.asarray(
+        client.chunkedgraph.get_roots(
+            syn_df[sv_column].values[stale], timestamp=timestamp
+        ),
+        dtype=np.int64,
+    )
+    syn_df = syn_df.copy()
+    syn_df.loc[stale, root_column] = new_roots
+    syn_df = syn_df[syn_df[config.pre_pt_root_id] != syn_df[config.post_pt_root_id]]
+    return syn_df.reset_index(drop=True), np.unique(new_roots)
+
+
+@timed("synapse_data")
+def live_synapse_data(
+    synapse_table,
+    root_id,
+    client,
+    timestamp,
+    config,
+    n_threads=2,
+    cache=None,
+):
+    """Synapse data for a live query, updated incrementally from the last refresh of
+    the same root id.
+
+    A root id never changes its supervoxels, so while it is still valid its synapses
+    are the same as at the last refresh and only partners that were edited in between
+    need new root ids. These are found with a single delta roots request to the
+    chunkedgraph and re-rooted from their supervoxel ids. A full query is run if there
+    is no previous refresh, the root id itself has been edited, the last full query
+    is older than config.live_refresh_max_age seconds (to pick up new annotations), or
+    the timestamp is earlier than that of the last refresh.
+
+    Cache entries are never changed after they are stored. Each refresh stores a new
+    entry in one step, and only if no later refresh has been stored meanwhile.
+
+    Parameters
+    ----------
+    synapse_table : str
+        Synapse table name.
+    root_id : int
+        Root id to query.
+    client : CAVEclient
+        Client for the datastack.
+    timestamp : datetime.datetime
+        Timestamp of the live query.
+    config : CommonConfig
+        App config.
+    n_threads : int, optional
+        Number of threads for a full query, by default 2.
+    cache : LRUCache, optional
+        Cache of previous refreshes, by default LIVE_QUERY_CACHE.
+
+    Returns
+    -------
+    pd.DataFrame
+        Output synapses.
+    pd.DataFrame
+        Input synapses.
+    dict
+        Cache entry for this refresh. "new_roots" holds the partner root ids that were
+        not present at the last refresh, or is None if everything was queried anew.
+    """
+    if cache is None:
+        cache = LIVE_QUERY_CACHE
+    key = (
+        client.server_address,
+        client.datastack_name,
+        synapse_table,
+        int(root_id),
+        auth_scope(client),
+    )
+    last = cache.get(key)
+
+    entry = None
+    if last is not None and timestamp == last["timestamp"]:
+        entry = dict(last, new_roots=np.array([], dtype=np.int64))
+    elif (
+        last is not None
+        and timestamp > last["timestamp"]
+        and (timestamp - last["fetched"]).total_seconds() < config.live_refresh_max_age
+    ):
+        expired_roots, _ = client.chunkedgraph.get_delta_roots(
+            last["timestamp"], timestamp
+        )
+        if root_id not in set(expired_roots):
+            pre_df, new_pre = reroot_partners(
+                last["pre"], "pre", expired_roots, client, timestamp, config
+            )
+            post_df, new_post = reroot_partners(
+                last["post"], "post", expired_roots, client, timestamp, config
+            )
+            entry = {
+                "key": key,
+                "timestamp": timestamp,
+                "fetched": last["fetched"],
+                "pre": pre_df,
+                "post": post_df,
+                "properties": last["properties"],
+                "new_roots": np.union1d(new_pre, new_post),
+            }
+
+    if entry is None:
+        with ThreadPoolExecutor(max(min(n_threads, 2), 1)) as exe:
+            pre = exe.submit(
+                _live_synapse_df,
+                "pre",
+                synapse_table,
+                root_id,
+                client,
+                timestamp,
+                config,
+            )
+            post = exe.submit(
+                _live_synapse_df,
+                "post",
+                synapse_table,
+                root_id,
+                client,
+                timestamp,
+                config,
+            )
+        entry = {
+            "key": key,
+            "timestamp": timestamp,
+            "fetched": timestamp,
+            "pre": pre.result(),
+            "post": post.result(),
+            "properties": {},
+            "new_roots": None,
+        }
+    _store_entry(cache, entry)
+
+    syn_columns = config.synapse_table_columns_dataframe
+    pre_df = entry["pre"][syn_columns]
+    post_df = entry["post"][syn_columns]
+    pre_df.attrs = entry["pre"].attrs
+    post_df.attrs = entry["post"].attrs
+    return pre_df, post_df, entry
+
+
+@timed("property_table_data")
+def live_property_data(
+    entry,
+    root_ids,
+    property_mapping,
+    client,
+    timestamp,
+    n_threads=1,
+    cache=None,
+):
+    """Property table data for a live refresh, querying only partners that are new
+    since the refresh in entry. Tables not yet in entry are queried for all root ids.
+
+    Parameters
+    ----------
+    entry : dict
+        Cache entry from live_synapse_data. It is not changed; a copy with the property
+        data added replaces it in the cache.
+    root_ids : array-like
+        All partner root ids.
+    property_mapping : dict
+        Property table configuration, as for property_table_data.
+    client : CAVEclient
+        Client for the datastack.
+    timestamp : datetime.datetime
+        Timestamp of the live query.
+    n_threads : int, optional
+        Number of threads, by default 1.
+    cache : LRUCache, optional
+        Cache of previous refreshes, by default LIVE_QUERY_CACHE.
+
+    Returns
+    -------
+    dict
+        Table name to dataframe indexed by root id, as from property_table_data.
+    """
+    if cache is None:
+        cache = LIVE_QUERY_CACHE
+    cached = entry["properties"]
+    keys = {tn: _property_key(tn, attrs) for tn, attrs in property_mapping.items()}
+    new_roots = entry["new_roots"]
+
+    full_tables = {
+        tn: attrs
+        for tn, attrs in property_mapping.items()
+        if new_roots is None or keys[tn] not in cached
+    }
+    patch_tables = {
+        tn: attrs for tn, attrs in property_mapping.items() if tn not in full_tables
+    }
+
+    dfs = property_table_data(root_ids, full_tables, client, timestamp, n_threads)
+    if len(patch_tables) > 0 and len(new_roots) > 0:
+        new_dfs = property_table_data(
+            new_roots, patch_tables, client, timestamp, n_threads
+        )
+    else:
+        new_dfs = {}
+    for tn in patch_tables:
+        old_df = cached[keys[tn]]
+        keep = old_df.index.isin(root_ids) & ~old_df.index.isin(new_roots)
+        if tn in new_dfs:
+            df = pd.concat([old_df[keep], new_dfs[tn]])
+        else:
+            df = old_df[keep]
+        df.attrs = old_df.attrs
+        dfs[tn] = df
+
+    properties = {**cached, **{keys[tn]: df for tn, df in dfs.items()}}
+    _store_entry(cache, dict(entry, properties=properties))
+    return dfs
@@ -1,6 +1,19 @@
+import time
+
 import flask
 from caveclient import CAVEclient
 
+from .cache_utilities import auth_scope, shared_cache
+from .timing_utilities import timed
+from .version_utilities import VERSION_WATCHER
+
+# Clients by (datastack, server address, auth token), stored with their creation time
+CLIENT_CACHE = shared_cache("client", maxsize=64)
+# Clients pin the latest materialization version on first use, so rebuild them regularly
+CLIENT_MAX_AGE = 600
+VERSION_WATCHER.register_cache(CLIENT_CACHE, lambda k: (k[1], k[0], None))
+TABLE_METADATA_CACHE = shared_cache("table_metadata", maxsize=1024)
+
 
 def get_all_schema_tables(
     schemata,
@@ -15,7 +28,7 @@ def get_all_schema_tables(
     for t in tables:
         if t in config.omit_cell_type_tables:
             continue
-        meta = client.materialize.get_table_metadata(t)
+        meta = table_metadata(client, t)
         if meta["schema"] in schemata:
             schema_tables.append(t)
     return [{"label": t, "value": t} for t in sorted(schema_tables)]
@@ -41,24 +54,80 @@ def get_type_tables(schemata, datastack, config):
     return new_tables
 
 
-def make_client(datastack, server_address):
-    """Build a framework client with appropriate auth token
+@timed("make_client")
+def make_client(datastack, server_address, max_age=None):
+    """Build a framework client with appropriate auth token, reusing a recent client
+    for the same datastack, server and token.
 
     Parameters
     ----------
     datastack : str
         Datastack name for client
-    config : dict
-        Config dict for settings such as server address.
     server_address : str, optional
         Global server address for the client, by default None. If None, uses the config dict.
+    max_age : float, optional
+        Seconds after which a cached client is rebuilt, by default CLIENT_MAX_AGE.
 
     """
     auth_token = flask.g.get("auth_token", None)
+    if max_age is None:
+        max_age = CLIENT_MAX_AGE
+    key = (datastack, server_address, auth_token)
+    cached = CLIENT_CACHE.get(key)
+    if cached is not None and time.time() - cached[1] < max_age:
+        return cached[0]
     client = CAVEclient(datastack, server_address=server_address, auth_token=auth_token)
+    CLIENT_CACHE.set(key, (client, time.time()))
+    VERSION_WATCHER.watch(client)
     return client
 
 
+def table_metadata(client, table_name):
+    """Table metadata from the materialization service, cached per datastack, table
+    and auth token
+
+    Parameters
+    ----------
+    client : CAVEclient
+        Client for the datastack.
+    table_name : str
+        Annotation table name.
+
+    Returns
+    -------
+    dict
+        Table metadata, including "schema" and "schema_type". Treat as read-only.
+    """
+    key = (client.server_address, client.datastack_name, table_name, auth_scope(client))
+    meta = TABLE_METADATA_CACHE.get(key)
+    if meta is None:
+        meta = client.materialize.get_table_metadata(table_name)
+        TABLE_METADATA_CACHE.set(key, meta)
+    return meta
+
+
+def pooled_client(client, pool_maxsize=None):
+    """Copy of a client for use by a data object, optionally with a blocking
+    connection pool for parallel requests.
+
+    Parameters
+    ----------
+    client : CAVEclient
+        Client to copy the datastack, server and auth token from.
+    pool_maxsize : int, optional
+        Connection pool size, by default None (the CAVEclient default pool).
+    """
+    pool_kwargs = {}
+    if pool_maxsize is not None:
+        pool_kwargs = dict(pool_block=True, pool_maxsize=pool_maxsize)
+    return CAVEclient(
+        datastack_name=client.datastack_name,
+        server_address=client.server_address,
+        auth_token=client.auth.token,
+        **pool_kwargs,
+    )
+
+
 def get_root_id_from_nuc_id(
     nuc_id,
     client,
@@ -89,6 +158,7 @@ def get_root_id_from_nuc_id(
     df = client.materialize.query_table(
         nucleus_table,
         filter_equal_dict={config.nucleus_id_column: nuc_id},
+        select_columns=config.nucleus_lookup_columns,
         timestamp=timestamp,
     )
     if len(df) == 0:
@@ -97,6 +167,28 @@ def get_root_id_from_nuc_id(
         return df.iloc[0][config.soma_pt_root_id]
 
 
+def get_root_ids_from_nuc_ids(
+    nuc_ids,
+    client,
+    nucleus_table,
+    config,
+    timestamp=None,
+):
+    """Look up current root ids for many nucleus ids at once, in the order given.
+    Raises an exception if any nucleus id is not found."""
+    df = client.materialize.query_table(
+        nucleus_table,
+        filter_in_dict={config.nucleus_id_column: list(nuc_ids)},
+        select_columns=config.nucleus_lookup_columns,
+        timestamp=timestamp,
+    )
+    root_lookup = df.set_index(config.nucleus_id_column)[config.soma_pt_root_id]
+    missing = [nid for nid in nuc_ids if nid not in root_lookup.index]
+    if len(missing) > 0:
+        raise Exception(f"Nucleus IDs not found in soma table: {missing}")
+    return [root_lookup.loc[nid] for nid in nuc_ids]
+
+
 def get_nucleus_id_from_root_id(
     root_id,
     client,
@@ -108,6 +200,7 @@ def get_nucleus_id_from_root_id(
     df = client.materialize.query_table(
         nucleus_table,
         filter_equal_dict={config.soma_pt_root_id: root_id},
+        select_columns=config.nucleus_lookup_columns,
         timestamp=timestamp,
     )
 
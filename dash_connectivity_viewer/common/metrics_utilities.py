@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import defaultdict
+
+import flask
+
+from .timing_utilities import callback_name, register_callback_names
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, v) for labels, v in self._values.items()]
+
+
+class Histogram(object):
+    """Cumulative histogram with fixed buckets and optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._counts = {}
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for ii, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[ii] += 1
+            self._sums[key] += value
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for labels, counts in self._counts.items():
+                for bound, count in zip(self.buckets, counts):
+                    out.append(
+                        (
+                            f"{self.name}_bucket",
+                            labels + (("le", _format_value(bound)),),
+                            count,
+                        )
+                    )
+                out.append((f"{self.name}_sum", labels, self._sums[labels]))
+                out.append((f"{self.name}_count", labels, counts[-1]))
+        return out
+
+
+class MetricsRegistry(object):
+    """Process-wide metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, description):
+        return self._get_or_create(name, lambda: Counter(name, description))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(name, description, buckets))
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def register_cache(self, name, cache):
+        """Report hits, misses and size of an LRUCache under a cache label"""
+        with self._lock:
+            self._caches[name] = cache
+
+    def _cache_lines(self):
+        with self._lock:
+            caches = list(self._caches.items())
+        if len(caches) == 0:
+            return []
+        lines = []
+        for metric, description, getter in [
+            ("dcv_cache_hits_total", "Cache lookups that found an entry", "hits"),
+            ("dcv_cache_misses_total", "Cache lookups that found no entry", "misses"),
+        ]:
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            lines += [
+                f"{metric}{_label_text([('cache', name)])} {getattr(cache, getter)}"
+                for name, cache in caches
+            ]
+        lines += [
+            "# HELP dcv_cache_entries Entries currently held in the cache",
+            "# TYPE dcv_cache_entries gauge",
+        ]
+        lines += [
+            f"dcv_cache_entries{_label_text([('cache', name)])} {len(cache)}"
+            for name, cache in caches
+        ]
+        return lines
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {_format_value(value)}")
+        lines += self._cache_lines()
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+CALLBACK_LATENCY = METRICS.histogram(
+    "dcv_callback_latency_seconds", "Dash callback request latency"
+)
+RESPONSE_BYTES = METRICS.histogram(
+    "dcv_callback_response_bytes",
+    "Size of Dash callback responses",
+    buckets=BYTE_BUCKETS,
+)
+SYNAPSES_FETCHED = METRICS.histogram(
+    "dcv_synapses_fetched",
+    "Synapses fetched per neuron query",
+    buckets=COUNT_BUCKETS,
+)
+PARTNER_COUNT = METRICS.histogram(
+    "dcv_partner_count", "Synaptic partners per neuron query", buckets=COUNT_BUCKETS
+)
+PROPERTY_QUERY_LATENCY = METRICS.histogram(
+    "dcv_property_query_seconds", "Latency of property table queries"
+)
+STATE_UPLOADS = METRICS.counter(
+    "dcv_state_uploads_total", "Neuroglancer states uploaded to the state server"
+)
+
+
+def register_metrics(app, config):
+    """Add a /metrics route with Prometheus text metrics and record callback latency
+    and response sizes.
+
+    Parameters
+    ----------
+    app : dash.Dash
+        App to instrument.
+    config : CommonConfig
+        App config. Nothing is added unless config.metrics_endpoint is True.
+    """
+    server = app.server
+    if not config.metrics_endpoint:
+        return
+    register_callback_names(app)
+    # Apps can share a Flask server, which only needs to be instrumented once
+    if "dcv_metrics" in server.extensions:
+        return
+    server.extensions["dcv_metrics"] = METRICS
+
+    @server.before_request
+    def _start_callback_clock():
+        if flask.request.path.endswith("_dash-update-component"):
+            flask.g.metrics_t0 = time.perf_counter()
+
+    @server.after_request
+    def _record_callback(response):
+        t0 = flask.g.pop("metrics_t0", None)
+        if t0 is not None:
+            callback = callback_name()
+            CALLBACK_LATENCY.observe(time.perf_counter() - t0, callback=callback)
+            n_bytes = response.content_length
+            if n_bytes is None and not response.is_streamed:
+                n_bytes = len(response.get_data())
+            if n_bytes is not None:
+                RESPONSE_BYTES.observe(n_bytes, callback=callback)
+        return response
+
+    server.add_url_rule(
+        "/metrics",
+        "dcv_metrics",
+        lambda: flask.Response(METRICS.render(), mimetype="text/plain; version=0.0.4"),
+    )
@@ -1,15 +1,18 @@
 import pandas as pd
 import numpy as np
 from dfbridge import DataframeBridge
-from caveclient import CAVEclient
 
 from dash_connectivity_viewer.common.lookup_utilities import (
     get_nucleus_id_from_root_id,
     get_root_id_from_nuc_id,
+    pooled_client,
 )
 
 from .dataframe_utilities import *
 from .link_utilities import voxel_resolution_from_info
+from .live_query_utilities import live_synapse_data, live_property_data
+from .timing_utilities import timed
+from .metrics_utilities import PARTNER_COUNT, SYNAPSES_FETCHED
 from multiprocessing import cpu_count
 
 
@@ -27,6 +30,7 @@ def _soma_property_entry(soma_table, c):
             },
             "suffix": c.num_soma_suffix,
             "table_filter": c.soma_table_query,
+            "filter_columns": [c.soma_ct_col] if c.soma_table_query else [],
             "data": None,
             "data_resolution": None,
         }
@@ -70,18 +74,14 @@ class NeuronData(object):
             self._root_id = None
             self._nucleus_id = object_id
 
-        self._client = CAVEclient(
-            datastack_name=client.datastack_name,
-            server_address=client.server_address,
-            auth_token=client.auth.token,
-            pool_block=True,
-            pool_maxsize=config.pool_maxsize,
-        )
+        self._client = pooled_client(client, pool_maxsize=config.pool_maxsize)
 
         self._property_tables = property_tables
 
         if config.synapse_table is None:
             synapse_table = client.info.get_datastack_info().get("synapse_table")
+        else:
+            synapse_table = config.synapse_table
         self._synapse_table = synapse_table
         self._synapse_table_properties = _synapse_properties(synapse_table, config)
 
@@ -98,6 +98,7 @@ class NeuronData(object):
         self._pre_syn_df = None
         self._post_syn_df = None
         self._synapse_data_resolution = None
+        self._live_entry = None
 
         self._viewer_resolution = voxel_resolution_from_info(client.info.info_cache)
 
@@ -107,6 +108,7 @@ class NeuronData(object):
 
         self._partner_soma_table = None
         self._partner_root_ids = None
+        self._property_frame_cache = None
 
         if soma_table is not None:
             self._property_tables.update(
@@ -154,6 +156,10 @@ class NeuronData(object):
     def live_query(self):
         return self._timestamp is not None
 
+    @property
+    def incremental_live_query(self):
+        return self.live_query and self.config.live_incremental_refresh
+
     @property
     def timestamp(self):
         return self._timestamp
@@ -186,18 +192,86 @@ class NeuronData(object):
             self._get_syn_df()
         return self._post_syn_df.copy()
 
-    def _get_syn_df(self):
-        self._pre_syn_df, self._post_syn_df = synapse_data(
-            synapse_table=self.synapse_table,
-            root_id=self.root_id,
-            client=self.client,
-            timestamp=self.timestamp,
-            config=self.config,
-            n_threads=self.n_threads,
+    def _pre_syn_view(self):
+        """Output synapses without a copy, for use within the library.
+
+        Column arrays are read-only. Take a shallow copy before adding columns, so that
+        the stored dataframe is unchanged.
+        """
+        if self._pre_syn_df is None:
+            self._get_syn_df()
+        return read_only(self._pre_syn_df)
+
+    def _post_syn_view(self):
+        """Input synapses without a copy, with read-only column arrays"""
+        if self._post_syn_df is None:
+            self._get_syn_df()
+        return read_only(self._post_syn_df)
+
+    def _queried_root_ids(self):
+        return self.root_id
+
+    def synapse_count(self, limit=None):
+        """Number of output and input synapses, without loading the synapse data.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Stop counting each direction at this number, by default None.
+
+        Returns
+        -------
+        int
+            Output synapses.
+        int
+            Input synapses.
+        """
+        if self._pre_syn_df is not None:
+            return len(self._pre_syn_df), len(self._post_syn_df)
+        return tuple(
+            synapse_count(
+                direction,
+                self.synapse_table,
+                self._queried_root_ids(),
+                self.client,
+                self.timestamp,
+                self.config,
+                limit=limit,
+            )
+            for direction in ["pre", "post"]
         )
+
+    def _get_syn_df(self):
+        if self.incremental_live_query:
+            self._pre_syn_df, self._post_syn_df, self._live_entry = live_synapse_data(
+                synapse_table=self.synapse_table,
+                root_id=self.root_id,
+                client=self.client,
+                timestamp=self.timestamp,
+                config=self.config,
+                n_threads=self.n_threads,
+            )
+        elif self.live_query:
+            self._pre_syn_df, self._post_syn_df = synapse_data(
+                synapse_table=self.synapse_table,
+                root_id=self.root_id,
+                client=self.client,
+                timestamp=self.timestamp,
+                config=self.config,
+                n_threads=self.n_threads,
+            )
+        else:
+            self._pre_syn_df, self._post_syn_df = cached_synapse_data(
+                synapse_table=self.synapse_table,
+                root_id=self.root_id,
+                client=self.client,
+                config=self.config,
+                n_threads=self.n_threads,
+            )
         self._synapse_data_resolution = self._pre_syn_df.attrs.get(
             "table_voxel_resolution"
         )
+        SYNAPSES_FETCHED.observe(len(self._pre_syn_df) + len(self._post_syn_df))
         self._populate_property_tables()
 
     @property
@@ -210,7 +284,7 @@ class NeuronData(object):
         if self._pre_syn_df is None:
             self._get_syn_df()
 
-        return np.unique(
+        root_ids = np.unique(
             np.concatenate(
                 (
                     self._pre_syn_df[self.config.post_pt_root_id].values,
@@ -218,6 +292,8 @@ class NeuronData(object):
                 )
             )
         )
+        PARTNER_COUNT.observe(len(root_ids))
+        return root_ids
 
     def partners_out(self, properties=True):
         return self._targ_table("pre", properties)
@@ -228,12 +304,16 @@ class NeuronData(object):
     def _targ_table(self, side, properties):
         if side == "pre":
             prefix = "post"
-            syn_df_grp = self.pre_syn_df().groupby(f"{prefix}_pt_root_id")
+            syn_df = self._pre_syn_view()
         elif side == "post":
             prefix = "pre"
-            syn_df_grp = self.post_syn_df().groupby(f"{prefix}_pt_root_id")
+            syn_df = self._post_syn_view()
+        return self._partner_table(syn_df, [f"{prefix}_pt_root_id"], properties)
+
+    def _partner_table(self, syn_df, group_columns, properties):
+        syn_df_grp = syn_df.groupby(group_columns)
         targ_df = self._make_simple_targ_df(syn_df_grp).rename(
-            columns={f"{prefix}_pt_root_id": self.config.root_id_col}
+            columns={group_columns[-1]: self.config.root_id_col}
         )
         if properties:
             targ_df = self._merge_property_tables(targ_df, self.config.root_id_col)
@@ -242,6 +322,7 @@ class NeuronData(object):
                 targ_df[cn] = np.nan
         return targ_df
 
+    @timed("make_simple_targ_df")
     def _make_simple_targ_df(self, df_grp):
         pts = df_grp[self.config.syn_pt_position].agg(list)
         num_syn = df_grp[self.config.syn_pt_position].agg(len)
@@ -258,13 +339,23 @@ class NeuronData(object):
         ).reset_index()
 
     def _populate_property_tables(self):
-        dfs = property_table_data(
-            self.partner_root_ids,
-            self._property_tables,
-            self.client,
-            self.timestamp,
-            self.n_threads,
-        )
+        if self._live_entry is not None:
+            dfs = live_property_data(
+                self._live_entry,
+                self.partner_root_ids,
+                self._property_tables,
+                self.client,
+                self.timestamp,
+                self.n_threads,
+            )
+        else:
+            dfs = property_table_data(
+                self.partner_root_ids,
+                self._property_tables,
+                self.client,
+                self.timestamp,
+                self.n_threads,
+            )
         for k, df in dfs.items():
             dbf = DataframeBridge(
                 self._property_tables[k].get("table_bridge_schema", None)
@@ -273,6 +364,7 @@ class NeuronData(object):
             self._property_tables[k]["data_resolution"] = df.attrs.get(
                 "table_voxel_resolution"
             )
+        self._property_frame_cache = None
 
     def property_data(self, table_name):
         if self._property_tables.get(table_name).get("data") is None:
@@ -302,23 +394,43 @@ class NeuronData(object):
     def property_column_suffix(self, table_name):
         return self._property_tables.get(table_name).get("suffix", "")
 
-    def _merge_property_tables(self, df, merge_column):
+    def _property_frame(self):
+        """Data of all property tables side by side, indexed by sorted root id, with
+        (table name, column) column labels"""
+        if self._property_frame_cache is None:
+            dfs = {tn: self.property_data(tn) for tn in self.property_tables}
+            self._property_frame_cache = pd.concat(
+                dfs.values(), axis=1, keys=dfs.keys(), join="outer"
+            ).sort_index()
+        return self._property_frame_cache
+
+    def _property_column_names(self, columns):
+        """Names of the property columns when joined to a dataframe with columns.
+
+        Columns of a table take its suffix if they are among its property columns or
+        would clash with an existing column.
+        """
+        taken = set(columns)
+        names = []
         for tn in self.property_tables:
-            df = df.merge(
-                self.property_data(tn),
-                left_on=merge_column,
-                right_index=True,
-                how="left",
-                suffixes=("", self.property_column_suffix(tn)),
-            )
-            df.rename(
-                columns={
-                    c: f"{c}{self.property_column_suffix(tn)}"
-                    for c in self.property_columns(tn)
-                    if f"{c}{self.property_column_suffix(tn)}" not in df.columns
-                },
-                inplace=True,
-            )
+            suffix = self.property_column_suffix(tn)
+            property_columns = set(self.property_columns(tn))
+            for c in self.property_data(tn).columns:
+                if c in taken or (c in property_columns and c + suffix not in taken):
+                    name = c + suffix
+                else:
+                    name = c
+                taken.add(name)
+                names.append(name)
+        return names
+
+    @timed("merge_property_tables")
+    def _merge_property_tables(self, df, merge_column):
+        if len(self.property_tables) > 0:
+            props = self._property_frame().reindex(df[merge_column].values)
+            props.columns = self._property_column_names(df.columns)
+            props.index = df.index
+            df = pd.concat([df, props], axis=1)
 
         if self.soma_table is not None:
             df[self.config.num_soma_col] = (
@@ -333,6 +445,7 @@ class NeuronData(object):
             self.root_id,
             self.client,
             self.timestamp,
+            select_columns=self.config.soma_table_select_columns,
         )
         if len(own_soma_df) != 1:
             own_soma_loc = np.nan
@@ -341,9 +454,10 @@ class NeuronData(object):
         return own_soma_loc
 
     def syn_all_df(self):
-        pre_df = self.pre_syn_df()
+        # Concatenation copies the data, so the stored dataframes need no copy here
+        pre_df = self._pre_syn_view().copy(deep=False)
         pre_df["direction"] = "pre"
-        post_df = self.post_syn_df()
+        post_df = self._post_syn_view().copy(deep=False)
         post_df["direction"] = "post"
         syn_df = pd.concat([pre_df, post_df])
         syn_df["x"] = 0
@@ -0,0 +1,125 @@
+from .neuron_data_base import NeuronData
+from .dataframe_utilities import batch_synapse_data
+from .lookup_utilities import get_root_ids_from_nuc_ids
+
+
+class NeuronDataBatch(NeuronData):
+    """Connectivity for many neurons at once.
+
+    Synapses are fetched with chunked filter_in_dict queries over all root ids and
+    property tables are queried once for the union of partners. Partner tables have
+    an additional column (config.query_root_id_col) with the queried neuron for each row.
+    """
+
+    def __init__(
+        self,
+        object_ids,
+        client,
+        config,
+        property_tables={},
+        timestamp=None,
+        n_threads=None,
+        id_type="root",
+    ):
+        super().__init__(
+            None,
+            client,
+            config,
+            property_tables=property_tables,
+            timestamp=timestamp,
+            n_threads=n_threads,
+            id_type=id_type,
+        )
+        object_ids = [int(x) for x in object_ids]
+        if id_type == "root":
+            self._root_ids = object_ids
+            self._nucleus_ids = None
+        elif id_type == "nucleus":
+            self._root_ids = None
+            self._nucleus_ids = object_ids
+
+    @property
+    def root_ids(self):
+        if self._root_ids is None:
+            self._root_ids = get_root_ids_from_nuc_ids(
+                self._nucleus_ids,
+                self.client,
+                self.soma_table,
+                self.config,
+                self.timestamp,
+            )
+        return self._root_ids
+
+    # Single-neuron lookups of NeuronData use root_id, so they are blocked here
+    @property
+    def root_id(self):
+        raise ValueError("NeuronDataBatch has multiple root ids, use root_ids")
+
+    @property
+    def nucleus_id(self):
+        raise ValueError(
+            "NeuronDataBatch has multiple neurons and no single nucleus id"
+        )
+
+    def _get_own_soma_loc(self):
+        raise ValueError("NeuronDataBatch has multiple neurons and no single soma")
+
+    def soma_location(self):
+        raise ValueError("NeuronDataBatch has multiple neurons and no single soma")
+
+    def soma_location_list(self, length):
+        raise ValueError("NeuronDataBatch has multiple neurons and no single soma")
+
+    def _queried_root_ids(self):
+        return self.root_ids
+
+    def _get_syn_df(self):
+        self._pre_syn_df, self._post_syn_df = batch_synapse_data(
+            synapse_table=self.synapse_table,
+            root_ids=self.root_ids,
+            client=self.client,
+            timestamp=self.timestamp,
+            config=self.config,
+            n_threads=min(self.n_threads, self.config.max_chunks),
+        )
+        self._synapse_data_resolution = self._pre_syn_df.attrs.get(
+            "table_voxel_resolution"
+        )
+        self._populate_property_tables()
+
+    def _targ_table(self, side, properties):
+        if side == "pre":
+            own_column, partner_column = (
+                self.config.pre_pt_root_id,
+                self.config.post_pt_root_id,
+            )
+            syn_df = self._pre_syn_view()
+        elif side == "post":
+            own_column, partner_column = (
+                self.config.post_pt_root_id,
+                self.config.pre_pt_root_id,
+            )
+            syn_df = self._post_syn_view()
+        targ_df = self._partner_table(
+            syn_df, [own_column, partner_column], properties
+        ).rename(columns={own_column: self.config.query_root_id_col})
+        return targ_df.sort_values(
+            by=[self.config.query_root_id_col, self.config.num_syn_col],
+            ascending=[True, False],
+        ).reset_index(drop=True)
+
+    def _split_by_root(self, targ_df):
+        split_dfs = {
+            rid: df.reset_index(drop=True)
+            for rid, df in targ_df.groupby(self.config.query_root_id_col)
+        }
+        return {
+            rid: split_dfs.get(rid, targ_df.iloc[0:0].reset_index(drop=True))
+            for rid in self.root_ids
+        }
+
+    def partners_out_by_root(self, properties=True):
+        return self._split_by_root(self.partners_out(properties=properties))
+
+    def partners_in_by_root(self, properties=True):
+        return self._split_by_root(self.partners_in(properties=properties))
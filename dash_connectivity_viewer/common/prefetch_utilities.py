@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .dataframe_utilities import SYNAPSE_CACHE, cached_synapse_data, synapse_cache_key
+from .metrics_utilities import METRICS
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+PREFETCHES = METRICS.counter(
+    "dcv_prefetch_total", "Speculative partner synapse fetches by outcome"
+)
+
+
+class Prefetcher(object):
+    """Runs speculative work in a small background thread pool, dropping work beyond
+    a cap on pending jobs or a rate limit rather than queueing it.
+
+    The pool is created in each process on first use, so it also works in forked workers.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._starts = deque()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _pool(self, max_workers):
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers, thread_name_prefix="prefetch"
+            )
+            self._pid = os.getpid()
+            self._pending = 0
+            self._starts.clear()
+            self._in_flight.clear()
+        return self._executor
+
+    def submit(
+        self,
+        func,
+        *args,
+        key=None,
+        max_concurrent=1,
+        max_pending=10,
+        max_per_minute=30,
+        **kwargs,
+    ):
+        """Run func in the background if the limits allow it.
+
+        Parameters
+        ----------
+        func : callable
+            Work to run.
+        key : hashable, optional
+            Identifies the work, which is not scheduled again while a job with the
+            same key is pending.
+        max_concurrent : int, optional
+            Number of background threads, by default 1. Only used when the pool is
+            created in a process.
+        max_pending : int, optional
+            Maximum number of jobs running or waiting, by default 10.
+        max_per_minute : int, optional
+            Maximum number of jobs started in any 60 s window, by default 30.
+
+        Returns
+        -------
+        bool
+            True if the job was scheduled.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while len(self._starts) > 0 and now - self._starts[0] > 60:
+                self._starts.popleft()
+            executor = self._pool(max_concurrent)
+            if (
+                key in self._in_flight
+                or self._pending >= max_pending
+                or len(self._starts) >= max_per_minute
+            ):
+                return False
+            self._pending += 1
+            self._starts.append(now)
+            if key is not None:
+                self._in_flight.add(key)
+        executor.submit(self._run, key, func, *args, **kwargs)
+        return True
+
+    def _run(self, key, func, *args, **kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            if logger is not None:
+                logger.warning(f"Prefetch failed: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._in_flight.discard(key)
+
+
+PREFETCHER = Prefetcher()
+
+
+def top_partners(targ_dfs, n, root_id_col, num_syn_col, exclude=()):
+    """Root ids of the n partners with the most synapses across partner tables"""
+    counts = (
+        pd.concat([df[[root_id_col, num_syn_col]] for df in targ_dfs])
+        .astype({root_id_col: np.int64})
+        .groupby(root_id_col)[num_syn_col]
+        .sum()
+    )
+    counts = counts[~counts.index.isin(list(exclude))]
+    return counts.nlargest(n).index.values
+
+
+def prefetch_partners(nrn_data, targ_dfs, config):
+    """Fetch synapse data for the top partners of a neuron into the synapse cache, in
+    the background, so that clicking through to one of them is served from cache.
+
+    Only materialized (not live) queries are prefetched. Does nothing unless
+    config.prefetch_top_partners is positive.
+
+    Parameters
+    ----------
+    nrn_data : NeuronData
+        Data object for the neuron whose partners were just shown.
+    targ_dfs : list of pd.DataFrame
+        Partner tables, with root id and synapse count columns.
+    config : CommonConfig
+        App config.
+
+    Returns
+    -------
+    int
+        Number of partners scheduled for fetching.
+    """
+    if config.prefetch_top_partners <= 0 or nrn_data.live_query:
+        return 0
+    root_ids = top_partners(
+        targ_dfs,
+        config.prefetch_top_partners,
+        config.root_id_col,
+        config.num_syn_col,
+        exclude=[nrn_data.root_id],
+    )
+    n_scheduled = 0
+    for root_id in root_ids:
+        key = synapse_cache_key(
+            nrn_data.synapse_table, root_id, nrn_data.client, config
+        )
+        if key in SYNAPSE_CACHE:
+            PREFETCHES.inc(outcome="cached")
+            continue
+        scheduled = PREFETCHER.submit(
+            cached_synapse_data,
+            nrn_data.synapse_table,
+            root_id,
+            nrn_data.client,
+            config,
+            n_threads=1,
+            key=key,
+            max_concurrent=config.prefetch_max_concurrent,
+            max_pending=config.prefetch_max_pending,
+            max_per_minute=config.prefetch_max_per_minute,
+        )
+        PREFETCHES.inc(outcome="scheduled" if scheduled else "dropped")
+        n_scheduled += scheduled
+    return n_scheduled
@@ -0,0 +1,172 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import flask
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+# Timer for the request being handled in the current context, None if timing is off
+_REQUEST_TIMER = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer(object):
+    """Collects named span durations for one request"""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self._lock:
+            self.spans.append((name, duration))
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.t0
+
+    def breakdown(self):
+        """Total seconds and number of calls per span name, in order of first call"""
+        totals = {}
+        with self._lock:
+            for name, duration in self.spans:
+                dur, count = totals.get(name, (0, 0))
+                totals[name] = (dur + duration, count + 1)
+        return totals
+
+    def server_timing(self):
+        """Server-Timing header value, with durations in milliseconds"""
+        entries = [
+            f"{name};dur={1000 * dur:.1f}"
+            for name, (dur, _) in self.breakdown().items()
+        ]
+        entries.append(f"total;dur={1000 * self.total:.1f}")
+        return ", ".join(entries)
+
+
+def current_timer():
+    return _REQUEST_TIMER.get()
+
+
+def start_timer():
+    """Start timing the current context. Returns a token for stop_timer."""
+    return _REQUEST_TIMER.set(RequestTimer())
+
+
+def stop_timer(token):
+    timer = _REQUEST_TIMER.get()
+    _REQUEST_TIMER.reset(token)
+    return timer
+
+
+@contextmanager
+def span(name):
+    """Time a block of code as part of the current request.
+
+    Does nothing beyond a context variable lookup when no request timer is running.
+    Spans in worker threads are not recorded, so wrap the call that submits the work.
+    """
+    timer = _REQUEST_TIMER.get()
+    if timer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - t0)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _REQUEST_TIMER.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def register_callback_names(app):
+    """Record a Dash app on its Flask server, so that callback_name accepts the outputs
+    of its callbacks"""
+    apps = app.server.extensions.setdefault("dcv_dash_apps", [])
+    if app not in apps:
+        apps.append(app)
+
+
+def callback_name():
+    """Output id of the Dash callback handled by the current request, or "unknown" if
+    the request does not name a callback of an app registered on the server.
+
+    The output is sent by the client, so it is only used once it is known to be a
+    callback, which keeps metric labels and log fields bounded.
+    """
+    body = flask.request.get_json(silent=True)
+    output = body.get("output") if isinstance(body, dict) else None
+    apps = flask.current_app.extensions.get("dcv_dash_apps", [])
+    if not isinstance(output, str) or not any(
+        output in app.callback_map for app in apps
+    ):
+        return "unknown"
+    # Multi-output callbacks are keyed as "..first.prop...second.prop..", name by the first
+    return output.strip(".").split("...")[0] if output.startswith("..") else output
+
+
+def register_request_timing(app, config):
+    """Time Dash callback requests and report the per-stage breakdown.
+
+    Parameters
+    ----------
+    app : dash.Dash
+        App to instrument.
+    config : CommonConfig
+        App config. Timing is on if config.request_timing is True, and the
+        Server-Timing header is added if config.server_timing_header is True.
+    """
+    if not config.request_timing:
+        return
+    register_callback_names(app)
+    # Apps can share a Flask server, which only needs to be instrumented once
+    if "dcv_request_timing" in app.server.extensions:
+        return
+    app.server.extensions["dcv_request_timing"] = True
+
+    @app.server.before_request
+    def _start_request_timer():
+        flask.g.request_timer_token = start_timer()
+
+    @app.server.after_request
+    def _report_request_timer(response):
+        token = flask.g.pop("request_timer_token", None)
+        if token is None:
+            return response
+        timer = stop_timer(token)
+        breakdown = timer.breakdown()
+        if len(breakdown) == 0:
+            return response
+        if logger is not None:
+            stages = " | ".join(
+                f"{name}: {dur:.3f} s (x{count})"
+                for name, (dur, count) in breakdown.items()
+            )
+            logger.bind(
+                callback=callback_name(),
+                total=timer.total,
+                spans={name: dur for name, (dur, _) in breakdown.items()},
+            ).info(f"Request timing | total: {timer.total:.3f} s | {stages}")
+        if config.server_timing_header:
+            response.headers["Server-Timing"] = timer.server_timing()
+        return response
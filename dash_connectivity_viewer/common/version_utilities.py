@@ -0,0 +1,147 @@
+import os
+import threading
+
+from .metrics_utilities import METRICS
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+CACHE_EVICTIONS = METRICS.counter(
+    "dcv_cache_evictions_total",
+    "Cache entries evicted because a new materialization version was released",
+)
+
+
+def _is_stale(entry_version, server_address, datastack, latest, version_changed):
+    server, ds, version = entry_version
+    if server != server_address or ds != datastack:
+        return False
+    if version is None:
+        return version_changed
+    return version != latest
+
+
+class VersionWatcher(object):
+    """Polls the latest materialization version of each datastack in use and evicts
+    cache entries for superseded versions.
+
+    Caches are registered with a function mapping a cache key to a (server address,
+    datastack, version) tuple. After every poll, entries of a watched datastack whose
+    version is not the latest are removed. A version of None marks entries that depend
+    on the version without recording it, such as clients that pin the version on
+    first use, and these are removed whenever the latest version changes.
+
+    Polling runs in a daemon thread, started in each process on first use so that it
+    also runs in forked workers.
+
+    Parameters
+    ----------
+    interval : float, optional
+        Seconds between polls, by default 300. If None, nothing is polled.
+    """
+
+    def __init__(self, interval=300):
+        self.interval = interval
+        self._clients = {}
+        self._versions = {}
+        self._caches = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+    def configure(self, interval):
+        """Use the shortest polling interval requested by any app"""
+        with self._lock:
+            if interval is None:
+                return
+            if self.interval is None or interval < self.interval:
+                self.interval = interval
+
+    def register_cache(self, cache, key_version):
+        """Evict entries of cache by the version that key_version finds in each key"""
+        with self._lock:
+            self._caches.append((cache, key_version))
+
+    def watch(self, client):
+        """Poll the datastack of client, using it for the version requests"""
+        if self.interval is None:
+            return
+        with self._lock:
+            self._clients[(client.server_address, client.datastack_name)] = client
+        self._ensure_started()
+
+    def version(self, server_address, datastack):
+        """Latest materialization version seen for a datastack, or None before the
+        first poll"""
+        with self._lock:
+            return self._versions.get((server_address, datastack))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="version-watcher", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Check the latest version of every watched datastack and evict stale entries.
+
+        Returns
+        -------
+        dict
+            (server address, datastack) to number of evicted entries.
+        """
+        with self._lock:
+            clients = list(self._clients.items())
+        evicted = {}
+        for key, client in clients:
+            try:
+                latest = int(client.materialize.most_recent_version())
+            except Exception as e:
+                if logger is not None:
+                    logger.warning(f"Version check failed for {key[1]}: {e}")
+                continue
+            with self._lock:
+                previous = self._versions.get(key)
+                self._versions[key] = latest
+            evicted[key] = self.evict(key[0], key[1], latest, previous)
+            if previous is not None and previous != latest and logger is not None:
+                logger.info(
+                    f"New materialization version {latest} for {key[1]}, "
+                    f"evicted {evicted[key]} cache entries"
+                )
+        return evicted
+
+    def evict(self, server_address, datastack, latest, previous=None):
+        """Remove cache entries of a datastack not at the latest version"""
+        with self._lock:
+            caches = list(self._caches)
+        version_changed = previous is not None and previous != latest
+        n_evicted = 0
+        for cache, key_version in caches:
+            n = cache.evict(
+                lambda k: _is_stale(
+                    key_version(k), server_address, datastack, latest, version_changed
+                )
+            )
+            if n > 0:
+                CACHE_EVICTIONS.inc(n)
+            n_evicted += n
+        return n_evicted
+
+    def stop(self):
+        self._stop.set()
+
+
+VERSION_WATCHER = VersionWatcher(interval=None)
+
+
+def configure_version_watcher(config):
+    """Turn on version polling at config.version_poll_interval seconds, if set"""
+    VERSION_WATCHER.configure(config.version_poll_interval)
@@ -0,0 +1,149 @@
+import time
+
+import numpy as np
+import orjson
+import pandas as pd
+import plotly.graph_objects as go
+
+from .import_utilities import preload
+from .link_utilities import seaborn, statebuilder
+from .lookup_utilities import get_type_tables, make_client
+
+try:
+    from loguru import logger
+except:
+    logger = None
+
+
+def warm_libraries():
+    """Run the first-call paths of pandas, plotly and the lazily imported link
+    dependencies, so that the first user request does not pay for them."""
+    preload(statebuilder, seaborn)
+    df = pd.DataFrame(
+        {
+            "root_id": np.arange(10) % 3,
+            "size": np.arange(10, dtype=float),
+            "pt_position": list(np.zeros((10, 3))),
+        }
+    )
+    grp = df.groupby("root_id")
+    targ_df = pd.DataFrame(
+        {"pt_position": grp["pt_position"].agg(list), "num_syn": grp["size"].agg(len)}
+    ).reset_index()
+    targ_df.merge(df, on="root_id", how="left").to_dict("records")
+    fig = go.Figure(go.Bar(x=targ_df["root_id"], y=targ_df["num_syn"]))
+    fig.update_layout(title="warmup")
+    orjson.dumps(fig.to_plotly_json(), option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def warmup_datastack(datastack, config, schemata=None, preload_table=None, tables=()):
+    """Build the client for a datastack and fill the info, version and table metadata
+    caches that the first request would otherwise fill.
+
+    Parameters
+    ----------
+    datastack : str
+        Datastack name.
+    config : CommonConfig
+        App config.
+    schemata : list of str, optional
+        Cell type schemata offered in the table dropdown. If set, the dropdown options
+        are computed, which caches the metadata of every table.
+    preload_table : callable, optional
+        Function of (client, table_name) that loads a table into the app's caches.
+    tables : list of str, optional
+        Tables to load with preload_table, at the current materialization version.
+
+    Returns
+    -------
+    dict
+        Seconds spent on each step.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    client = make_client(datastack, config.server_address)
+    client.info.get_datastack_info()
+    # Pins the version the client uses until it is rebuilt
+    client.materialize.version
+    timings["client"] = time.perf_counter() - t0
+
+    if schemata is not None:
+        t0 = time.perf_counter()
+        get_type_tables(schemata, datastack, config)
+        timings["table_metadata"] = time.perf_counter() - t0
+
+    if preload_table is not None:
+        for table_name in tables:
+            t0 = time.perf_counter()
+            preload_table(client, table_name)
+            timings[f"table:{table_name}"] = time.perf_counter() - t0
+    return timings
+
+
+def register_warmup(app, config, schemata=None, preload_table=None):
+    """Add an app.warmup method that prepares a freshly started worker.
+
+    Call it after workers fork (clients hold connection pools, which must not be
+    shared across processes), e.g. in a gunicorn config file:
+
+        def post_fork(server, worker):
+            from run_cell_type_table import app
+            app.warmup(datastacks=["minnie65_phase3_v1"])
+
+    Parameters
+    ----------
+    app : dash.Dash
+        App to add the method to.
+    config : CommonConfig
+        App config.
+    schemata : list of str, optional
+        Cell type schemata of the app's table dropdown, if it has one.
+    preload_table : callable, optional
+        Function of (client, table_name) that loads a table into the app's caches.
+        Without it, app.warmup ignores preload_tables.
+    """
+
+    def warmup(datastacks=None, preload_tables=(), libraries=True):
+        """Fill the client pool and metadata caches for some datastacks.
+
+        Parameters
+        ----------
+        datastacks : list of str, optional
+            Datastacks to prepare, by default the configured datastack.
+        preload_tables : list of str, optional
+            Tables to load for the current materialization version of each datastack.
+        libraries : bool, optional
+            If True (default), also warm up pandas, plotly and the link dependencies.
+
+        Returns
+        -------
+        dict
+            Seconds spent per step for each datastack, or the error message if a
+            datastack could not be prepared.
+        """
+        if datastacks is None:
+            datastacks = [config.default_datastack]
+        report = {}
+        if libraries:
+            t0 = time.perf_counter()
+            warm_libraries()
+            report["libraries"] = time.perf_counter() - t0
+        # make_client reads the auth token from flask.g
+        with app.server.app_context():
+            for datastack in datastacks:
+                try:
+                    report[datastack] = warmup_datastack(
+                        datastack,
+                        config,
+                        schemata=schemata,
+                        preload_table=preload_table,
+                        tables=preload_tables,
+                    )
+                except Exception as e:
+                    # A failed warmup should leave a working, if cold, worker
+                    report[datastack] = f"{type(e).__name__}: {e}"
+        if logger is not None:
+            logger.info(f"Warmup for {app.title} | {report}")
+        return report
+
+    app.warmup = warmup
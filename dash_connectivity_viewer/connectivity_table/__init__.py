@@ -4,6 +4,8 @@ from .callbacks import register_callbacks
 from .layout import title, page_layout, app_layout
 from ..common.external_stylesheets import external_stylesheets
 from ..common.dash_url_helper import setup
+from ..common.config import CommonConfig
+from ..common.metrics_utilities import register_metrics
 import flask
 
 __version__ = "0.0.1"
@@ -17,4 +19,5 @@ def create_app(name=__name__, config={}, **kwargs):
     app.layout = app_layout
     setup(app, page_layout=page_layout)
     register_callbacks(app, config)
+    register_metrics(app, CommonConfig(config))
     return app
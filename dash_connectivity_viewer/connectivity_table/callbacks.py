@@ -1,5 +1,6 @@
 from dash import html
 from ..common.neuron_data_base import NeuronData
+from ..common.neuron_data_batch import NeuronDataBatch
 from dash.dependencies import Input, Output, State
 from dash import callback_context
 
@@ -17,6 +18,11 @@ from ..common.dataframe_utilities import (
 )
 from ..common.dash_url_helper import _COMPONENT_ID_TYPE
 from ..common.lookup_utilities import make_client
+from ..common.timing_utilities import register_request_timing
+from ..common.warmup_utilities import register_warmup
+from ..common.version_utilities import configure_version_watcher
+from ..common.prefetch_utilities import prefetch_partners
+from ..common.admission_utilities import admit
 from .config import ConnectivityConfig
 
 import datetime
@@ -49,6 +55,9 @@ OutputLiveQueryValue = Output(
 
 def register_callbacks(app, config):
     c = ConnectivityConfig(config)
+    register_request_timing(app, c)
+    configure_version_watcher(c)
+    register_warmup(app, c)
 
     @app.callback(
         Output("data-table", "selected_rows"),
@@ -61,9 +70,14 @@ def register_callbacks(app, config):
     @app.callback(
         Output("data-table", "columns"),
         InputDatastack,
+        Input("client-info-json", "data"),
     )
-    def define_table_columns(_):
-        return [{"name": i, "id": i} for i in c.table_columns]
+    def define_table_columns(_, info_cache):
+        if info_cache is not None and "," in str(info_cache.get("root_id", "")):
+            columns = [c.query_root_id_col] + c.table_columns
+        else:
+            columns = c.table_columns
+        return [{"name": i, "id": i} for i in columns]
 
     @app.callback(
         OutputDatastack,
@@ -115,7 +129,7 @@ def register_callbacks(app, config):
 
         try:
             client = make_client(datastack_name, c.server_address)
-            info_cache = client.info.info_cache[datastack_name]
+            info_cache = dict(client.info.info_cache[datastack_name])
             info_cache["global_server"] = client.server_address
         except Exception as e:
             return (
@@ -161,40 +175,54 @@ def register_callbacks(app, config):
             root_id = None
         else:
             if id_type == "root_id":
-                object_id = int(anno_id)
+                object_ids = [int(x) for x in anno_id.split(",") if x.strip()]
                 object_id_type = "root"
             elif id_type == "nucleus_id":
-                object_id = int(anno_id)
+                object_ids = [int(x) for x in anno_id.split(",") if x.strip()]
                 object_id_type = "nucleus"
             else:
                 raise ValueError('id_type must be either "root_id" or "nucleus_id"')
 
         try:
-            nrn_data = NeuronData(
-                object_id,
-                client,
-                config=c,
-                timestamp=timestamp,
-                id_type=object_id_type,
-                n_threads=1,
-            )
-
-            root_id = nrn_data.root_id
+            if len(object_ids) == 1:
+                nrn_data = NeuronData(
+                    object_ids[0],
+                    client,
+                    config=c,
+                    timestamp=timestamp,
+                    id_type=object_id_type,
+                    n_threads=1,
+                )
+                root_id = nrn_data.root_id
+                stringify_cols = [c.root_id_col]
+            else:
+                nrn_data = NeuronDataBatch(
+                    object_ids,
+                    client,
+                    config=c,
+                    timestamp=timestamp,
+                    id_type=object_id_type,
+                )
+                root_id = ",".join([str(x) for x in nrn_data.root_ids])
+                stringify_cols = [c.root_id_col, c.query_root_id_col]
 
-            pre_targ_df = nrn_data.partners_out()
-            pre_targ_df = stringify_root_ids(
-                pre_targ_df, stringify_cols=[c.root_id_col]
-            )
+            with admit(nrn_data, c):
+                pre_targ_df = nrn_data.partners_out()
+                pre_targ_df = stringify_root_ids(
+                    pre_targ_df, stringify_cols=stringify_cols
+                )
 
-            post_targ_df = nrn_data.partners_in()
-            post_targ_df = stringify_root_ids(
-                post_targ_df, stringify_cols=[c.root_id_col]
-            )
+                post_targ_df = nrn_data.partners_in()
+                post_targ_df = stringify_root_ids(
+                    post_targ_df, stringify_cols=stringify_cols
+                )
 
             n_syn_pre = pre_targ_df[c.num_syn_col].sum()
             n_syn_post = post_targ_df[c.num_syn_col].sum()
 
             info_cache["root_id"] = str(root_id)
+            if len(object_ids) == 1:
+                prefetch_partners(nrn_data, [pre_targ_df, post_targ_df], c)
 
         except Exception as e:
             return (
@@ -411,4 +439,4 @@ def register_callbacks(app, config):
             "All Output Link", href=url, target="_blank", style={"font-size": "20px"}
         )
 
-    pass
\ No newline at end of file
+    pass
@@ -23,7 +23,7 @@ def page_layout(state: State = None):
             [
                 dbc.Col(
                     [
-                        html.Div("Cell ID:"),
+                        html.Div("Cell ID (comma-separated for multiple):"),
                     ],
                     align="end",
                 ),
@@ -0,0 +1,27 @@
+import run_cell_type_table
+import run_connectivity_table
+import run_ct_connectivity
+from dash_connectivity_viewer.combined_app import create_combined_app
+
+minnie_configs = {
+    "connectivity_table": run_connectivity_table.minnie_config,
+    "cell_type_connectivity": run_ct_connectivity.minnie_config,
+    "cell_type_table": run_cell_type_table.minnie_config,
+}
+
+flywire_configs = {
+    "connectivity_table": run_connectivity_table.flywire_config,
+    "cell_type_connectivity": run_ct_connectivity.flywire_config,
+    "cell_type_table": run_cell_type_table.flywire_config,
+}
+
+fanc_configs = {
+    "connectivity_table": run_connectivity_table.fanc_config,
+    "cell_type_connectivity": run_ct_connectivity.fanc_config,
+    "cell_type_table": run_cell_type_table.fanc_config,
+}
+
+server = create_combined_app(minnie_configs)
+
+if __name__ == "__main__":
+    server.run(port=8050)